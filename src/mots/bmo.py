@@ -6,70 +6,366 @@
 
 from __future__ import annotations
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import json
 import requests
 import logging
+import sqlite3
+import threading
+import time
 
-from mots.settings import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from mots.exceptions import MissingBugzillaAPIKey
+from mots.settings import settings
+from mots.utils import chunk_list
 
-logger = logging.getLogger(__name__)
+try:
+    # orjson is an optional, faster drop-in replacement for parsing JSON.
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
 
 
-class MissingBugzillaAPIKey(Exception):
-    """Raised when a Bugzilla API key was not detected in settings."""
+logger = logging.getLogger(__name__)
 
-    pass
+# Fields to request from Bugzilla when fetching user data.
+USER_FIELDS = "real_name,nick,name,id,email"
 
 
-def get_bmo_data(people: list) -> dict:
+def get_bmo_data(people: list, use_cache: bool = True, refresh: bool = False) -> dict:
     """Fetch an updated dictionary from Bugzilla with user data.
 
     Dictionary keys are set to user IDs, and values are set to various data.
+
+    :param people: a list of people dictionaries containing a `bmo_id` key
+    :param use_cache: if set to `False`, the on-disk cache is bypassed
+    :param refresh: if set to `True`, cached data is not used, but fetched data is
+        still cached
     """
-    bmo_client = BMOClient()
-    bmo_data = bmo_client.get_users_by_ids([p["bmo_id"] for p in people])
+    # The same person can be listed more than once, only request each user once.
+    ids = sorted({int(p["bmo_id"]) for p in people})
+    with BMOClient(use_cache=use_cache, refresh=refresh) as bmo_client:
+        bmo_data = bmo_client.get_users_by_ids(ids)
     return bmo_data
 
 
+class _TokenBucket:
+    """A thread-safe token bucket used to rate limit outgoing requests.
+
+    :param capacity: the maximum number of tokens that can be stored (burst size)
+    :param refill_per_sec: the number of tokens added back to the bucket every second
+    """
+
+    def __init__(self, capacity: float, refill_per_sec: float):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n: float = 1):
+        """Take `n` tokens from the bucket, blocking only if not enough are left."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._last) * self.refill_per_sec
+            )
+            self._last = now
+            if self._tokens < n:
+                delay = (n - self._tokens) / self.refill_per_sec
+                logger.debug(f"Rate limit reached, waiting {delay:.3f} seconds.")
+                time.sleep(delay)
+                self._tokens = n
+                self._last = time.monotonic()
+            self._tokens -= n
+
+
+class _TTLCache:
+    """A small in-memory LRU cache whose entries expire after a given time.
+
+    :param ttl: the number of seconds after which an entry is considered expired
+    :param maxsize: the maximum number of entries kept in the cache
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._d = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value stored at `key`, or `None` if missing or expired."""
+        with self._lock:
+            if key not in self._d:
+                return None
+            timestamp, value = self._d[key]
+            if time.monotonic() - timestamp > self.ttl:
+                del self._d[key]
+                return None
+            self._d.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store `value` at `key`, evicting the least recently used entry if full."""
+        with self._lock:
+            self._d[key] = (time.monotonic(), value)
+            self._d.move_to_end(key)
+            while len(self._d) > self.maxsize:
+                self._d.popitem(last=False)
+
+    def set_many(self, items: dict):
+        """Store all key/value pairs in `items` with a single timestamp."""
+        with self._lock:
+            now = time.monotonic()
+            for key, value in items.items():
+                self._d[key] = (now, value)
+                self._d.move_to_end(key)
+            while len(self._d) > self.maxsize:
+                self._d.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        with self._lock:
+            self._d.clear()
+
+
+class _DiskCache:
+    """A SQLite backed cache of Bugzilla user data, keyed by Bugzilla URL and user ID.
+
+    :param path: the path of the SQLite database file
+    :param ttl: the number of seconds after which an entry is considered stale
+    :param base_url: the Bugzilla API URL that entries are stored for
+
+    Stale entries are kept on disk so that they can be used as a fallback when
+    Bugzilla can not be reached.
+    """
+
+    # SQLite limits the number of host parameters in a single statement.
+    MAX_PARAMETERS = 500
+
+    def __init__(self, path: Path, ttl: float, base_url: str = settings.BUGZILLA_URL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.base_url = base_url
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Open the database and create the table on first access."""
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path)
+            # Users of different Bugzilla instances (e.g. staging and production)
+            # share IDs, so they are stored separately.
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS bmo_users_by_url("
+                "base_url TEXT, id INTEGER, fetched_at REAL, stale_at REAL, blob BLOB, "
+                "PRIMARY KEY (base_url, id))"
+            )
+        return self._connection
+
+    def get_many(self, ids: list[int], include_stale: bool = False) -> dict:
+        """Return cached user data for given IDs, skipping stale rows by default."""
+        users = {}
+        stale_at = 0 if include_stale else time.time()
+        for chunk in chunk_list(ids, self.MAX_PARAMETERS):
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                "SELECT id, blob FROM bmo_users_by_url WHERE base_url = ? "
+                f"AND id IN ({placeholders}) AND stale_at > ?",
+                (self.base_url, *chunk, stale_at),
+            )
+            users.update({_id: json.loads(blob) for _id, blob in rows})
+        return users
+
+    def set_many(self, users: dict):
+        """Store user data, replacing existing entries."""
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO bmo_users_by_url VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.base_url, _id, now, now + self.ttl, json.dumps(user))
+                    for _id, user in users.items()
+                ],
+            )
+
+    def close(self):
+        """Close the database connection if it was opened."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
 class BMOClient:
-    """A thin wrapper as a Bugzilla API client."""
+    """A thin wrapper as a Bugzilla API client.
+
+    A single HTTP session is kept open for the lifetime of the client, so that
+    connections to Bugzilla are reused. The client can be used as a context manager to
+    close the session once it is no longer needed.
+
+    User data fetched by ID is cached in memory and shared between all instances, and
+    is also persisted on disk so that it can be reused across separate runs. When
+    `refresh` is set, all users are fetched from Bugzilla and written to the caches.
+    """
+
+    _cache = _TTLCache(ttl=600, maxsize=1024)
+
+    # The maximum number of IDs requested at once, to keep URLs at a reasonable length.
+    IDS_PER_REQUEST = 100
+    MAX_WORKERS = 4
 
-    def __init__(self, token: str | None = None, base_url: str = settings.BUGZILLA_URL):
+    def __init__(
+        self,
+        token: str | None = None,
+        base_url: str = settings.BUGZILLA_URL,
+        rate: float = settings.BUGZILLA_RATE_LIMIT,
+        burst: int = settings.BUGZILLA_RATE_BURST,
+        use_cache: bool = True,
+        refresh: bool = False,
+    ):
         if not token:
             token = settings.BUGZILLA_API_KEY
             if not token:
                 raise MissingBugzillaAPIKey()
         self._headers = {"X-BUGZILLA-API-KEY": token, "User-Agent": settings.USER_AGENT}
         self._base_url = base_url
+        self._refresh = refresh
+        self._bucket = _TokenBucket(capacity=burst, refill_per_sec=rate)
+
+        # Retry transient errors and rate limiting with an exponential backoff. When
+        # retries are exhausted, the last response is returned and handled below.
+        retries = Retry(
+            total=5,
+            backoff_factor=0.3,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retries)
+        self._session = requests.Session()
+        self._session.headers.update(self._headers)
+        self._session.mount("https://", adapter)
+
+        self._disk_cache = (
+            _DiskCache(
+                settings.BUGZILLA_CACHE_FILE, settings.BUGZILLA_CACHE_TTL, base_url
+            )
+            if use_cache
+            else None
+        )
+
+    def __enter__(self) -> "BMOClient":
+        """Return the client itself when used as a context manager."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the underlying session when exiting the context manager."""
+        self.close()
+
+    def close(self):
+        """Close the underlying HTTP session and disk cache."""
+        self._session.close()
+        if self._disk_cache:
+            self._disk_cache.close()
+
+    def _log_error(self, query, response: requests.Response):
+        """Log an unsuccessful response, including when to retry if provided."""
+        logger.error(f"Error searching {query}: {response.status_code}")
+        if "Retry-After" in response.headers:
+            logger.error(f"Retry after: {response.headers['Retry-After']}")
 
     def _get(self, path: str, params=None):
+        self._bucket.consume()
         logger.debug(f"GET {self._base_url}/{path}")
         params = params or {}
-        response = requests.get(
-            f"{self._base_url}/{path}", headers=self._headers, params=params
-        )
+        response = self._session.get(f"{self._base_url}/{path}", params=params)
         return response
 
     def get_users_by_ids(self, ids: list[str]):
-        """Get user data by BMO IDs."""
-        fields = ["real_name", "nick", "name", "id", "email"]
-        response = self._get("user", {"ids": ids, "include_fields": ",".join(fields)})
-        if response.status_code != 200:
-            logger.error(f"Error searching {ids}: {response.status_code}")
+        """Get user data by BMO IDs.
+
+        IDs that were recently fetched are served from the in-memory or on-disk cache,
+        and only the remaining IDs are requested from Bugzilla. If Bugzilla can not be
+        reached, stale entries from the disk cache are used instead.
+        """
+        # The in-memory cache is shared by clients of different Bugzilla instances.
+        cached = {}
+        missing = []
+        for _id in ids:
+            user = (
+                None if self._refresh else self._cache.get((self._base_url, int(_id)))
+            )
+            if user is None:
+                missing.append(int(_id))
+            else:
+                cached[int(_id)] = user
+
+        if missing and self._disk_cache and not self._refresh:
+            from_disk = self._disk_cache.get_many(missing)
+            self._cache.set_many(self._cache_keys(from_disk))
+            cached.update(from_disk)
+            missing = [_id for _id in missing if _id not in from_disk]
+
+        if not missing:
+            logger.debug(f"All {len(cached)} users served from cache.")
+            return cached
+
+        chunks = chunk_list(missing, self.IDS_PER_REQUEST)
+        try:
+            with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+                results = list(executor.map(self._fetch_users_by_ids, chunks))
+        except requests.ConnectionError:
+            stale = self._disk_cache.get_many(missing, True) if self._disk_cache else {}
+            if not stale:
+                raise
+            logger.warning(f"Could not reach Bugzilla, using {len(stale)} stale users.")
+            cached.update(stale)
+            return cached
+
+        if None in results:
             return
 
-        result = response.json()
-        return {u["id"]: u for u in result["users"]}
+        fetched = {u["id"]: u for result in results for u in result}
+        self._cache.set_many(self._cache_keys(fetched))
+        if self._disk_cache:
+            self._disk_cache.set_many(fetched)
+        cached.update(fetched)
+        return cached
+
+    def _cache_keys(self, users: dict) -> dict:
+        """Return given users by ID, keyed for the in-memory cache instead."""
+        return {(self._base_url, _id): user for _id, user in users.items()}
+
+    def _fetch_users_by_ids(self, ids: list[int]) -> list[dict] | None:
+        """Request a single chunk of users from Bugzilla."""
+        response = self._get("user", {"ids": ids, "include_fields": USER_FIELDS})
+        if not response.ok:
+            self._log_error(ids, response)
+            return
+        return _loads(response.content)["users"]
+
+    def get_users_by_emails(self, emails: list[str]):
+        """Get user data by email addresses (i.e. Bugzilla login names)."""
+        response = self._get("user", {"names": emails, "include_fields": USER_FIELDS})
+        if not response.ok:
+            self._log_error(emails, response)
+            return
+
+        result = _loads(response.content)
+        return {u["name"]: u for u in result["users"]}
 
     def get_matches(self, match: str) -> list[dict]:
         """Get user data based on provided info."""
-        fields = ["real_name", "nick", "email", "name", "id"]
-        response = self._get(
-            "user", {"match": match, "include_fields": ",".join(fields)}
-        )
-        if response.status_code != 200:
-            logger.error(f"Error searching {match}: {response.status_code}")
+        response = self._get("user", {"match": match, "include_fields": USER_FIELDS})
+        if not response.ok:
+            self._log_error(match, response)
             return
 
-        result = response.json()
+        result = _loads(response.content)
         return result["users"]
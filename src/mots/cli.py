@@ -4,58 +4,141 @@
 
 """This module sets up parsers and maps cli commands to methods."""
 
-from datetime import datetime
+from __future__ import annotations
+
+from functools import lru_cache
 from pathlib import Path
 import argparse
 import getpass
 import logging
 import sys
+import time
+from typing import TYPE_CHECKING
 
-from mots import module
-from mots import config
-from mots.bmo import MissingBugzillaAPIKey, BMOClient
-from mots.ci import validate_version_tag
-from mots.directory import Directory
-from mots.export import export_to_format
+from mots.exceptions import MissingBugzillaAPIKey
 from mots.logging import init_logging
 from mots.settings import settings
 from mots.utils import (
     get_list_input,
     mkdir_if_not_exists,
     touch_if_not_exists,
+    update_check_due,
     check_for_updates as _check_for_updates,
 )
-from mots.yaml import yaml
 from mots import __version__
 
+if TYPE_CHECKING:
+    from mots.config import FileConfig
+    from mots.directory import Directory
+
 
 logger = logging.getLogger(__name__)
 
+# NOTE: modules that are expensive to import (e.g. `mots.bmo`, `mots.config`,
+# `mots.directory`, and `mots.export`) are imported inside the commands that need
+# them, so that they are not loaded when they are not needed (e.g. when running
+# `mots --help`).
+
+# The export is streamed to its destination in many small chunks, so buffer writes to
+# files generously to reduce the number of system calls.
+EXPORT_BUFFER_SIZE = 256 * 1024
+
+
+def _load_config(
+    args: argparse.Namespace, load: bool = True, read_only: bool = False
+) -> "FileConfig":
+    """Return a file config for the path provided in arguments, loaded if needed.
+
+    :param load: if set to `True`, load the configuration from disk
+    :param read_only: if set to `True`, the configuration may be loaded from a JSON
+        cache, and must not be modified or written
+
+    Loaded file configs are cached and shared until the file changes on disk, so
+    callers that modify the configuration must not pass `load=True`.
+    """
+    from mots.config import FileConfig
+
+    path = Path(args.path)
+    if not load:
+        return FileConfig(path)
+    stat = path.stat()
+    return _load_file_config(path.resolve(), stat.st_mtime_ns, stat.st_size, read_only)
+
+
+@lru_cache(maxsize=16)
+def _load_file_config(
+    path: Path, mtime_ns: int, size: int, read_only: bool
+) -> "FileConfig":
+    """Load and return a file config, keyed by the file's modification time and size."""
+    from mots.config import FileConfig
+
+    file_config = FileConfig(path, json_cache=read_only)
+    file_config.load()
+    return file_config
+
+
+def _build_directory(file_config: "FileConfig") -> "Directory":
+    """Return a loaded directory for the provided file config."""
+    from mots.directory import Directory
+
+    directory = Directory(file_config)
+    directory.load()
+    return directory
+
+
+def _load_directory(
+    args: argparse.Namespace, reload: bool = False
+) -> tuple["Directory", bool]:
+    """Return a directory from the index cache if possible, or build and cache it.
+
+    :param args: the parsed arguments, including `path` and `no_index_cache`
+    :param reload: if set, always build the directory and refresh the cache
+
+    The second item of the returned tuple indicates whether the cache was used.
+    """
+    from mots.directory import cache_directory, load_cached_directory
+
+    config_path = Path(args.path)
+    if not args.no_index_cache and not reload:
+        directory = load_cached_directory(config_path)
+        if directory:
+            return directory, True
+
+    directory = _build_directory(_load_config(args, read_only=True))
+    if not args.no_index_cache:
+        cache_directory(directory, config_path)
+    return directory, False
+
 
 def init(args: argparse.Namespace) -> None:
     """Initialize mots configuration file."""
-    file_config = config.FileConfig(Path(args.path))
+    file_config = _load_config(args, load=False)
     file_config.init()
 
 
 def ls(args: argparse.Namespace) -> None:
     """List modules."""
-    file_config = config.FileConfig(Path(args.path))
-    file_config.load()
+    from mots import module
+
+    # Keep the round-trip loader, whose mappings are printed in file order.
+    file_config = _load_config(args)
     module.ls(file_config.config["modules"])
 
 
 def show(args: argparse.Namespace) -> None:
     """Show given module details."""
-    file_config = config.FileConfig(Path(args.path))
-    file_config.load()
+    from mots import module
+
+    # Keep the round-trip loader, whose mappings are printed in file order.
+    file_config = _load_config(args)
     module.show(file_config.config["modules"], args.module)
 
 
 def validate(args: argparse.Namespace) -> None:
     """Validate configuration and show error output if applicable."""
-    file_config = config.FileConfig(Path(args.path))
-    file_config.load()
+    from mots import config
+
+    file_config = _load_config(args, read_only=True)
     errors = config.validate(file_config.config, file_config.repo_path) or []
     for error in errors:
         logger.error(error)
@@ -64,15 +147,16 @@ def validate(args: argparse.Namespace) -> None:
 
 def clean(args: argparse.Namespace) -> None:
     """Run clean methods for configuration file and write to disk."""
-    file_config = config.FileConfig(Path(args.path))
-    file_config.load()
-    config.clean(file_config, refresh=args.refresh)
+    from mots import config
+
+    # The configuration is loaded from disk by `config.clean`.
+    file_config = _load_config(args, load=False)
+    config.clean(file_config, refresh=args.refresh, use_cache=not args.no_cache)
 
 
 def check_hashes(args: argparse.Namespace) -> None:
     """Check stored hashes against calculated hashes and exit with appropriate code."""
-    file_config = config.FileConfig(Path(args.path))
-    file_config.load()
+    file_config = _load_config(args)
     errors = file_config.check_hashes()
     if errors:
         for error in errors:
@@ -82,14 +166,24 @@ def check_hashes(args: argparse.Namespace) -> None:
 
 def query(args: argparse.Namespace) -> None:
     """Query list of files for module information."""
-    file_config = config.FileConfig(Path(args.path))
-    file_config.load()
-    directory = Directory(file_config)
-    directory.load()
+    directory, cached = _load_directory(args)
     result = directory.query(*args.paths)
+    unowned = [path for path, modules in result.path_map.items() if not modules]
+    if cached and unowned and directory.changed_since_index(*unowned):
+        # Some paths may have been added or moved since the index was cached.
+        logger.debug("Paths changed since index was cached, reloading directory.")
+        directory, _ = _load_directory(args, reload=True)
+        result = directory.query(*args.paths)
+
+    # Many paths usually resolve to the same modules, so only join their names once.
+    module_names = {}
+    lines = []
     for path, modules in result.path_map.items():
-        module_names = ",".join([m.machine_name for m in modules])
-        print(f"{path}:{module_names}\n")
+        key = tuple(id(m) for m in modules)
+        if key not in module_names:
+            module_names[key] = ",".join(m.machine_name for m in modules)
+        lines.append(f"{path}:{module_names[key]}\n")
+    sys.stdout.write("".join(lines))
 
 
 def add(args: argparse.Namespace) -> None:
@@ -111,12 +205,17 @@ def add(args: argparse.Namespace) -> None:
     params["peers"] = [{"bmo_id": int(bmo_id)} for bmo_id in params["peers"]]
 
     parent = input("Enter a machine name of the parent module (optional): ") or None
-    file_config = config.FileConfig(Path(args.path))
+
+    from mots import config
+
+    file_config = _load_config(args, load=False)
     config.add(params, file_config, parent=parent, write=True)
 
 
 def ci(args: argparse.Namespace) -> None:
     """Perform CI checks or validations."""
+    from mots.ci import validate_version_tag
+
     try:
         validate_version_tag()
     except ValueError as e:
@@ -129,60 +228,78 @@ def version():
     return __version__
 
 
-def export(args: argparse.Namespace) -> None:
-    """Export repo configuration and write to disk, or print to stdout as needed."""
-    file_config = config.FileConfig(Path(args.path))
-    file_config.load()
-    directory = Directory(file_config)
-    directory.load()
+def _export(args: argparse.Namespace, directory: "Directory") -> None:
+    """Export directory and write to disk, or print to stdout as needed."""
+    from mots.export import export_to_stream
 
+    export_config = directory.config_handle.config.get("export", {})
     frmt = (
         args.format
         if args.format
-        else file_config.config.get("export", {}).get(
-            "format", settings.DEFAULT_EXPORT_FORMAT
-        )
+        else export_config.get("format", settings.DEFAULT_EXPORT_FORMAT)
     )
 
-    # Render output based on provided format.
-    output = export_to_format(directory, frmt)
-
+    # Render output based on provided format, streaming it to its destination.
     if not args.out:
         # Explicit output path was not provided, try to get it from config.
-        if file_config.config.get("export", {}).get("path"):
-            out_path = Path(file_config.config["export"]["path"])
-            with out_path.open("w", encoding="utf-8", newline="\n") as f:
+        if export_config.get("path"):
+            out_path = Path(export_config["path"])
+            with out_path.open(
+                "w", encoding="utf-8", newline="\n", buffering=EXPORT_BUFFER_SIZE
+            ) as f:
                 logger.info(f"Writing output to specified file path ({out_path})...")
-                f.write(output)
+                export_to_stream(directory, f, frmt)
         else:
             # No output path could be determined, so output to standard out.
-            print(output)
+            export_to_stream(directory, sys.stdout, frmt)
+            sys.stdout.write("\n")
     else:
         # TODO: do more checks here to make sure we don't overwrite important things.
         logger.info(f"Writing output to specified file path ({args.out})...")
-        with args.out.open("w", encoding="utf-8", newline="\n") as f:
-            f.write(output)
+        with args.out.open(
+            "w", encoding="utf-8", newline="\n", buffering=EXPORT_BUFFER_SIZE
+        ) as f:
+            export_to_stream(directory, f, frmt)
+
+
+def export(args: argparse.Namespace) -> None:
+    """Export repo configuration and write to disk, or print to stdout as needed."""
+    directory, _ = _load_directory(args)
+    _export(args, directory)
 
 
 def export_and_clean(args: argparse.Namespace) -> None:
     """Run clean, export, and clean again to save users keystrokes."""
+    from mots import config
+
+    file_config = _load_config(args, load=False)
+    use_cache = not args.no_cache
+
     # The first clean checks mots.yaml for any issues and synchronizes with BMO.
-    clean(args)
+    config.clean(file_config, refresh=args.refresh, use_cache=use_cache)
 
-    # The export exports the yaml file to rst. This assumes that the export path is
-    # defined in the configuration.
-    export(args)
+    export_config = file_config.config.get("export", {})
+    if args.out or args.format or not {"path", "format"} <= export_config.keys():
+        # The export exports the yaml file to rst. This assumes that the export path
+        # is defined in the configuration.
+        _export(args, _build_directory(file_config))
 
-    # The last clean resets hashes
-    clean(args)
+        # The last clean resets hashes. People were already synchronized above.
+        config.clean(file_config, refresh=False, use_cache=use_cache)
+    else:
+        # The last clean renders the export to hash it anyway, so let it also write
+        # the same content to the export path instead of rendering it twice.
+        config.clean(file_config, refresh=False, use_cache=use_cache, write_export=True)
 
 
 def write(args: argparse.Namespace):
     """Set a specified settings variable to the provided value."""
+    from mots.yaml import safe_dump, safe_load
+
     key = args.key[0]
 
     with settings.OVERRIDES_FILE.open("r", encoding="utf-8") as f:
-        overrides = yaml.load(f) or {}
+        overrides = safe_load(f) or {}
 
     if key not in settings.DEFAULTS:
         raise ValueError(f"{key} does not exist in defaults.")
@@ -207,7 +324,7 @@ def write(args: argparse.Namespace):
     )
 
     with settings.OVERRIDES_FILE.open("w", encoding="utf-8", newline="\n") as f:
-        yaml.dump(overrides, f)
+        safe_dump(overrides, f)
 
 
 def read(args: argparse.Namespace):
@@ -234,8 +351,10 @@ def read(args: argparse.Namespace):
 
 def search(args: argparse.Namespace):
     """Search Bugzilla API for users, given an email address."""
-    bmo_client = BMOClient()
-    result = bmo_client.get_matches(args.match)
+    from mots.bmo import BMOClient
+
+    with BMOClient() as bmo_client:
+        result = bmo_client.get_matches(args.match)
     logger.info(f"Found {len(result)} users.")
     logger.info("Tip: you can copy and paste a dictionary entry into a field.")
 
@@ -257,7 +376,7 @@ def call_main_with_args():
     an integration (e.g., mach), then the integration must call `main` directly with
     the arguments.
     """
-    parser = create_parser()
+    parser = _get_main_parser(tuple(sys.argv[1:]))
     args = parser.parse_args()
     main(args)
 
@@ -274,14 +393,26 @@ def main(
     if hasattr(args, "func"):
         if skip_update_check:
             logger.debug("Skipping update check.")
-        elif args.func != check_for_updates and settings.CHECK_FOR_UPDATES:
+        elif (
+            args.func != check_for_updates
+            and settings.CHECK_FOR_UPDATES
+            and update_check_due(
+                settings.UPDATE_CHECK_STAMP_FILE, settings.UPDATE_CHECK_INTERVAL
+            )
+        ):
             try:
                 _check_for_updates(settings.CHECK_PRE_RELEASES)
             except Exception as e:
                 logger.warning("Could not check for updates.")
                 logger.debug(e)
-        logger.debug(f"Calling {args.func} with {args}...")
-        st = datetime.now()
+            else:
+                # Only record successful checks, so failed checks are retried.
+                settings.UPDATE_CHECK_STAMP_FILE.touch()
+        # Use deferred formatting since debug logging is usually disabled.
+        debug = logger.isEnabledFor(logging.DEBUG)
+        logger.debug("Calling %s with %s...", args.func, args)
+        if debug:
+            st = time.perf_counter()
         try:
             args.func(args)
         except MissingBugzillaAPIKey:
@@ -300,11 +431,23 @@ def main(
             logger.exception(e)
         else:
             logger.info("Success!")
-        et = datetime.now()
-        logger.debug(f"{args.func} took {(et - st).total_seconds()} seconds.")
+        if debug:
+            logger.debug("%s took %.3f seconds.", args.func, time.perf_counter() - st)
     else:
         # By default, print help to screen.
-        create_parser().print_help()
+        _get_main_parser().print_help()
+
+
+@lru_cache(maxsize=None)
+def _get_main_parser(argv: tuple[str, ...] | None = None) -> argparse.ArgumentParser:
+    """Return the main parser, creating it only once per process.
+
+    :param argv: if provided, only arguments of the selected command are populated
+
+    Integrations (e.g. mach) call :func:`create_parser` directly, and may modify the
+    parser they receive, so that function always returns a new parser.
+    """
+    return create_parser(argv=list(argv) if argv is not None else None)
 
 
 def _add_path_argument(_parser):
@@ -317,8 +460,47 @@ def _add_path_argument(_parser):
     )
 
 
-def create_parser(subcommand=None):
-    """Create parser, subparsers, and arguments."""
+# A table of all commands, in the form (group, name, function, help text). Commands
+# without a group are added directly to the main parser.
+COMMANDS = tuple(
+    (group, func.__name__.replace("_", "-"), func, help_text)
+    for group, func, help_text in (
+        (None, ci, "perform CI checks or operations"),
+        (None, init, "initialize mots configuration in repo"),
+        (None, clean, "clean mots config"),
+        (None, check_hashes, "check mots config and export hashes"),
+        (None, query, "query the module directory"),
+        (None, export, "export the module directory"),
+        (None, export_and_clean, "perform automatic cleaning and exporting"),
+        (None, validate, "validate mots config"),
+        (None, check_for_updates, "check for new versions of mots"),
+        ("module", add, "add a new module"),
+        ("module", ls, "list all modules"),
+        ("module", show, "show module details"),
+        ("settings", write, "update settings variable and save to disk"),
+        ("settings", read, "get settings variable, or all if no key is provided"),
+        ("user", search, "search Bugzilla user database"),
+    )
+)
+
+
+def _selected_command(argv: list[str]) -> str | None:
+    """Return the first positional argument (i.e. the command) in argv, if any."""
+    for arg in argv:
+        if arg in ("-h", "--help"):
+            return None
+        if not arg.startswith("-"):
+            return arg
+    return None
+
+
+def create_parser(subcommand=None, argv: list[str] | None = None):
+    """Create parser, subparsers, and arguments.
+
+    :param subcommand: if provided, return the parser of the given subcommand
+    :param argv: if provided, only populate arguments for the command selected in
+        `argv`; other commands are still registered so that they appear in help
+    """
     parsers = {}
 
     parser = argparse.ArgumentParser(description="main command line interface for mots")
@@ -345,82 +527,122 @@ def create_parser(subcommand=None):
         "default": settings.DEFAULT_CONFIG_FILEPATH,
     }
 
-    for _cli, func, help_text in (
-        (main_cli, ci, "perform CI checks or operations"),
-        (main_cli, init, "initialize mots configuration in repo"),
-        (main_cli, clean, "clean mots config"),
-        (main_cli, check_hashes, "check mots config and export hashes"),
-        (main_cli, query, "query the module directory"),
-        (main_cli, export, "export the module directory"),
-        (main_cli, export_and_clean, "perform automatic cleaning and exporting"),
-        (main_cli, validate, "validate mots config"),
-        (main_cli, check_for_updates, "check for new versions of mots"),
-        (module_cli, add, "add a new module"),
-        (module_cli, ls, "list all modules"),
-        (module_cli, show, "show module details"),
-        (settings_cli, write, "update settings variable and save to disk"),
-        (settings_cli, read, "get settings variable, or all if no key is provided"),
-        (user_cli, search, "search Bugzilla user database"),
-    ):
-        name = func.__name__.replace("_", "-")
-        parsers[name] = _cli.add_parser(name, help=help_text)
-        parsers[name].set_defaults(func=func)
+    subcommand_parsers = {
+        "user": user_parser,
+        "module": module_parser,
+        "settings": settings_parser,
+    }
 
-    # Add custom arguments where needed.
-    parsers["query"].add_argument("paths", nargs="+", help="a list of paths to query")
-    parsers["query"].add_argument(*path_flags, **path_args)
+    group_clis = {
+        None: main_cli,
+        "module": module_cli,
+        "settings": settings_cli,
+        "user": user_cli,
+    }
 
-    parsers["export"].add_argument(
-        "--format", "-f", type=str, choices=("rst",), help="the format of exported data"
-    )
-    parsers["export"].add_argument(
-        "--out", "-o", type=Path, help="the file path to output to"
-    )
-    parsers["export"].add_argument(*path_flags, **path_args)
-    parsers["export-and-clean"].add_argument(*path_flags, **path_args)
-    parsers["export-and-clean"].add_argument(
-        "--format", "-f", type=str, choices=("rst",), help="the format of exported data"
-    )
-    parsers["export-and-clean"].add_argument(
-        "--out", "-o", type=Path, help="the file path to output to"
-    )
+    for group, name, func, help_text in COMMANDS:
+        parsers[name] = group_clis[group].add_parser(name, help=help_text)
+        parsers[name].set_defaults(func=func)
+    groups = {name: group for group, name, _, _ in COMMANDS}
 
-    parsers["write"].add_argument("key", nargs=1, help="the settings key to set")
-    parsers["write"].add_argument(
-        "value", nargs="?", help="the value to set key to if present"
-    )
+    # Custom arguments are added by the functions below, only when needed.
+    def add_index_cache_arguments(_parser):
+        _parser.add_argument(
+            "--no-index-cache",
+            action="store_true",
+            help="do not use or update the cached directory index",
+        )
 
-    parsers["read"].add_argument(
-        "key",
-        nargs="?",
-        help="fetch the value of key if provided, or all keys otherwise",
-    )
+    def add_query_arguments(_parser):
+        _parser.add_argument("paths", nargs="+", help="a list of paths to query")
+        _parser.add_argument(*path_flags, **path_args)
+        add_index_cache_arguments(_parser)
 
-    parsers["search"].add_argument("match", nargs=1, help="a search string")
-    parsers["check-for-updates"].add_argument(
-        "--include-pre-releases",
-        action="store_true",
-        help="include pre releases in check",
-        default=settings.CHECK_PRE_RELEASES,
-    )
+    def add_export_arguments(_parser):
+        _parser.add_argument(
+            "--format",
+            "-f",
+            type=str,
+            choices=("rst",),
+            help="the format of exported data",
+        )
+        _parser.add_argument(
+            "--out", "-o", type=Path, help="the file path to output to"
+        )
+        _parser.add_argument(*path_flags, **path_args)
 
-    parsers["init"].add_argument(*path_flags, **path_args)
-    parsers["validate"].add_argument(*path_flags, **path_args)
-    parsers["clean"].add_argument(*path_flags, **path_args)
-    parsers["check-hashes"].add_argument(*path_flags, **path_args)
+    def add_export_only_arguments(_parser):
+        add_export_arguments(_parser)
+        add_index_cache_arguments(_parser)
 
-    for _parser in (parsers["clean"], parsers["export-and-clean"]):
-        # Add common --refresh argument to both parsers.
+    def add_refresh_arguments(_parser):
         _parser.add_argument(
             "--refresh", action="store_true", help="refresh user data from Bugzilla"
         )
+        _parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="do not use cached user data from Bugzilla",
+        )
 
-    subcommand_parsers = {
-        "user": user_parser,
-        "module": module_parser,
-        "settings": settings_parser,
+    def add_clean_arguments(_parser):
+        _parser.add_argument(*path_flags, **path_args)
+        add_refresh_arguments(_parser)
+
+    def add_export_and_clean_arguments(_parser):
+        add_export_arguments(_parser)
+        add_refresh_arguments(_parser)
+
+    def add_write_arguments(_parser):
+        _parser.add_argument("key", nargs=1, help="the settings key to set")
+        _parser.add_argument(
+            "value", nargs="?", help="the value to set key to if present"
+        )
+
+    def add_read_arguments(_parser):
+        _parser.add_argument(
+            "key",
+            nargs="?",
+            help="fetch the value of key if provided, or all keys otherwise",
+        )
+
+    def add_search_arguments(_parser):
+        _parser.add_argument("match", nargs=1, help="a search string")
+
+    def add_check_for_updates_arguments(_parser):
+        _parser.add_argument(
+            "--include-pre-releases",
+            action="store_true",
+            help="include pre releases in check",
+            default=settings.CHECK_PRE_RELEASES,
+        )
+
+    def add_path_argument(_parser):
+        _parser.add_argument(*path_flags, **path_args)
+
+    populators = {
+        "query": add_query_arguments,
+        "export": add_export_only_arguments,
+        "export-and-clean": add_export_and_clean_arguments,
+        "write": add_write_arguments,
+        "read": add_read_arguments,
+        "search": add_search_arguments,
+        "check-for-updates": add_check_for_updates_arguments,
+        "init": add_path_argument,
+        "validate": add_path_argument,
+        "clean": add_clean_arguments,
+        "check-hashes": add_path_argument,
     }
 
+    # Only populate the selected command (or all commands in the selected group) if
+    # possible, otherwise populate all commands.
+    selected = _selected_command(argv) if argv is not None else None
+    if selected not in parsers and selected not in subcommand_parsers:
+        selected = None
+    for name, populate in populators.items():
+        if selected is None or selected in (name, groups[name]):
+            populate(parsers[name])
+
     if not subcommand:
         return parser
     if subcommand in subcommand_parsers:
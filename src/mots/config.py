@@ -6,26 +6,30 @@
 
 from __future__ import annotations
 
-from collections import defaultdict
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 import io
 import hashlib
+import json
 import logging
+import os
+import sys
 
 from datetime import datetime, timezone
 from pathlib import Path
-from ruamel.yaml import YAML
+from typing import BinaryIO, Collection, Iterator
 
-from mots.bmo import get_bmo_data
 from mots.directory import Directory, People
-from mots.export import export_to_format
 from mots.module import Module
 from mots.utils import generate_machine_readable_name
+from mots.yaml import get_yaml, load_fast
 from mots.settings import settings
 
 logger = logging.getLogger(__name__)
 
-yaml = YAML()
-yaml.indent(mapping=2, sequence=4, offset=2)
+# NOTE: ruamel.yaml, mots.bmo and mots.export (and their dependencies) are slow to
+# import, so they are only imported where needed.
 
 QUICK_START_BLURB = "\n".join(
     (
@@ -47,6 +51,13 @@ ALLOWED_NICK_ONLY = [
     "TLMC",
 ]
 
+# Top-level keys that are required in the configuration file.
+REQUIRED_KEYS = frozenset(("repo", "created_at", "updated_at", "modules"))
+
+# The version of the JSON config cache format, increased to invalidate existing caches
+# when the way the configuration is parsed changes.
+JSON_CACHE_VERSION = 2
+
 
 class ValidationError(TypeError):
     """Thrown when a particular module is not valid."""
@@ -57,13 +68,27 @@ class ValidationError(TypeError):
 class FileConfig:
     """Loader and writer for filesystem based configuration."""
 
-    def __init__(self, path: Path = settings.DEFAULT_CONFIG_FILEPATH):
-        """Initialize the configuration with provided config file path."""
+    def __init__(
+        self, path: Path = settings.DEFAULT_CONFIG_FILEPATH, json_cache: bool = False
+    ):
+        """Initialize the configuration with provided config file path.
+
+        :param path: the path of the config file
+        :param json_cache: if set to `True`, load the configuration from a JSON cache
+            when the config file has not changed since the cache was written. The
+            loaded configuration is made of plain dictionaries and lists, so this
+            should only be used when the configuration is not modified or written.
+        """
         if not path.exists() and path.is_file():
             raise ValueError(f"{path} does not exist or is not a file.")
         self.path = path
         self.repo_path = path.parent
         self.config = None
+        self.json_cache = json_cache
+        self._modules_by_machine_name = None
+        # The modification time and size of the file when the configuration was last
+        # loaded or written, used to skip reloading an unchanged file.
+        self._loaded_stat = None
 
     def init(self):
         """Initialize a repo with a config file, if it does not contain it."""
@@ -71,7 +96,9 @@ class FileConfig:
             # File does not exist, create it.
             now = datetime.now(timezone.utc).isoformat()
             self.config = {
-                "repo": str(Path(self.path).resolve().parent.name),
+                # Only the name of the parent directory is needed, so make the path
+                # absolute without resolving (and checking) each of its components.
+                "repo": os.path.basename(os.path.dirname(os.path.abspath(self.path))),
                 "created_at": now,
                 "updated_at": None,
                 "hashes": {"config": None, "export": None},
@@ -84,31 +111,138 @@ class FileConfig:
         else:
             logger.warning(f"mots configuration file detected in {self.path}.")
 
+    @property
+    def json_cache_path(self) -> Path:
+        """Return the path of the JSON cache for this config file."""
+        key = hashlib.sha256(str(self.path.resolve()).encode("utf-8")).hexdigest()
+        return settings.INDEX_CACHE_DIRECTORY / f"config-{key}.json"
+
+    @property
+    def modules_by_machine_name(self) -> dict[str, dict]:
+        """Return the top level modules in the configuration, by machine name.
+
+        The index is built on first access after each load. Modules that are added to
+        the configuration directly (i.e. not via :func:`add`) are not indexed.
+        """
+        if self._modules_by_machine_name is None:
+            # Iterate in reverse so that the first module wins in case of duplicates.
+            self._modules_by_machine_name = {
+                module["machine_name"]: module
+                for module in reversed(self.config["modules"])
+            }
+        return self._modules_by_machine_name
+
     def load(self):
-        """Load configuration from file."""
-        with self.path.open("r", encoding="utf-8") as f:
-            self.config = yaml.load(f)
+        """Load configuration from file.
+
+        If the file has not changed since the configuration was last loaded or
+        written, the configuration already in memory is kept as is.
+        """
+        stat = self.path.stat()
+        loaded_stat = (stat.st_mtime_ns, stat.st_size)
+        if self.config is not None and self._loaded_stat == loaded_stat:
+            logger.debug(f"{self.path} has not changed, skipping reload.")
+            return
+
+        if self.json_cache:
+            source = {
+                "version": JSON_CACHE_VERSION,
+                "source_mtime_ns": stat.st_mtime_ns,
+                "source_size": stat.st_size,
+            }
+            if self._load_json_cache(source):
+                self._modules_by_machine_name = None
+            else:
+                # The configuration will not be written, so comments and formatting
+                # can be discarded in favour of the faster safe loader.
+                self.load_fast()
+                self._write_json_cache(source)
+        else:
+            self._modules_by_machine_name = None
+            # The parsers decode UTF-8 input themselves, so read the file at once
+            # instead of through a text wrapper.
+            self.config = get_yaml().load(self.path.read_bytes())
+        self._loaded_stat = loaded_stat
+
+    def load_fast(self):
+        """Load configuration from file, without preserving comments or formatting.
+
+        The safe loader uses the ruamel.yaml.clib C extension when it is available, so
+        this is much faster than :meth:`load`, and resolves scalars the same way. The
+        loaded configuration is made of plain dictionaries and lists, and should not be
+        written back to disk.
+        """
+        self._modules_by_machine_name = None
+        self._loaded_stat = None
+        self.config = load_fast(self.path.read_bytes())
+
+    def _load_json_cache(self, source: dict) -> bool:
+        """Load configuration from the JSON cache if it matches the source file."""
+        try:
+            with self.json_cache_path.open("r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if any(cached.get(key) != value for key, value in source.items()):
+            return False
+        logger.debug(f"Loaded configuration from {self.json_cache_path}.")
+        self.config = cached["data"]
+        return True
+
+    def _write_json_cache(self, source: dict):
+        """Write the loaded configuration to the JSON cache."""
+        cache_path = self.json_cache_path
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = cache_path.with_suffix(".tmp")
+        with temp_path.open("w", encoding="utf-8") as f:
+            json.dump(
+                {**source, "data": self.config},
+                f,
+                separators=(",", ":"),
+                default=str,
+            )
+        os.replace(temp_path, cache_path)
 
     def check_hashes(self) -> list[str]:
         """Check that the hashes in the config are up to date.
 
-        Upon calling this function, the existing configuration is copied and stripped
-        of volatile keys, then a hash is calculated and compared against the old hash.
+        Upon calling this function, each hash stored in the configuration is calculated
+        again, excluding volatile keys, and compared against the old hash. A missing
+        config hash, or a missing export hash when an export is configured, is an error.
 
         If there is a mismatch, return non-zero exit code. Otherwise return 0.
         """
         errors = []
-        config = self.config.copy()
 
-        if "export" in self.config and "path" in self.config["export"]:
-            with (self.repo_path / config["export"]["path"]).open("rb") as f:
-                export = f.read()
+        # The export hash is only expected when an export is configured. Missing hashes
+        # are errors, so only calculate the hashes that are stored in the config.
+        stored_hashes = self.config.get("hashes") or {}
+        which = []
+        for hash_key in ("config", "export"):
+            if hash_key == "export" and "export" not in self.config:
+                continue
+            if hash_key in stored_hashes:
+                which.append(hash_key)
+            else:
+                errors.append(f"Missing {hash_key} hash.")
+                errors.append(f"{hash_key} file is out of date.")
+
+        if "export" in which and "path" in self.config.get("export", {}):
+            # Stream the export file through the hasher instead of reading it whole.
+            with (self.repo_path / self.config["export"]["path"]).open("rb") as f:
+                original_hashes, hashes = calculate_hashes(self.config, f, which)
         else:
-            export = None
+            original_hashes, hashes = calculate_hashes(self.config, None, which)
 
-        original_hashes, hashes = calculate_hashes(self.config, export)
+        if original_hashes.get("config") not in (None, hashes.get("config")):
+            # Config files written by older versions of mots store a hash of the YAML
+            # dump instead, which is still accepted until the next clean.
+            legacy_hash = calculate_config_hash(self.config, legacy=True)
+            if original_hashes["config"] == legacy_hash:
+                logger.warning("Legacy config hash found, run `mots clean` to update.")
+                hashes["config"] = legacy_hash
 
-        for hash_key in ("config", "export"):
+        for hash_key in which:
             if original_hashes.get(hash_key) != hashes.get(hash_key):
                 errors.append(f"Mismatch in {hash_key} hash detected.")
                 errors.append(
@@ -123,8 +257,13 @@ class FileConfig:
         logger.debug(f"Writing configuration to {self.path}")
         self.config["updated_at"] = datetime.now(timezone.utc).isoformat()
         self.config["hashes"] = hashes or {}
-        with self.path.open("w", encoding="utf-8", newline="\n") as f:
-            yaml.dump(self.config, f)
+        # Dump to memory first, since the emitter writes to the stream in many small
+        # chunks, then write the UTF-8 encoded result to disk at once.
+        with io.BytesIO() as stream:
+            get_yaml().dump(self.config, stream)
+            self.path.write_bytes(stream.getbuffer())
+        stat = self.path.stat()
+        self._loaded_stat = (stat.st_mtime_ns, stat.st_size)
 
 
 def reference_anchor_for_module(
@@ -146,46 +285,135 @@ def reference_anchor_for_module(
 
     This is needed so that ruamel.yaml can correctly reference anchors to people.
     """
-    logger.debug(f"Setting reference to {person} as {key} in {module['machine_name']}")
+    logger.debug(
+        "Setting reference to %s as %s in %s", person, key, module["machine_name"]
+    )
 
     referrer = module["meta"][key] if key.endswith("_emeritus") else module[key]
+    people = file_config.config["people"]
+    position = directory.people.by_bmo_id.get(person["bmo_id"])
 
-    if person["bmo_id"] not in directory.people.by_bmo_id:
+    if position is None:
         # Person has to be added to directory before adding the reference.
-        file_config.config["people"].append(person)
-        directory.load_people()
-        directory.people.refresh_by_bmo_id()
+        people.append(person)
+        directory.people.add(person)
         referrer[index] = person
     else:
         # Associate the directory entry with the referrer.
-        referrer[index] = file_config.config["people"][
-            directory.people.by_bmo_id[person["bmo_id"]]
-        ]
+        referrer[index] = people[position]
+
 
+def _sha1(data: bytes = b""):
+    """Return a SHA-1 hash object, which is not used for security purposes.
 
-def calculate_hashes(config: dict, export: bytes) -> tuple[dict, dict]:
-    """Calculate a hash of the yaml config file."""
-    config = config.copy()
+    Hashes are only used to detect changes. Flagging them as such allows SHA-1 to
+    be used on systems where it is restricted (e.g. in FIPS mode).
+    """
+    if sys.version_info >= (3, 9):
+        return hashlib.sha1(data, usedforsecurity=False)
+    return hashlib.sha1(data)
+
+
+def _file_digest(f: BinaryIO) -> str:
+    """Return the SHA-1 hex digest of a binary file, read in chunks."""
+    if hasattr(hashlib, "file_digest"):
+        # Python 3.11+ reads the file into the hasher without Python level buffers.
+        return hashlib.file_digest(f, _sha1).hexdigest()
+
+    digest = _sha1()
+    view = memoryview(bytearray(2**20))
+    size = f.readinto(view)
+    while size:
+        digest.update(view[:size])
+        size = f.readinto(view)
+    return digest.hexdigest()
+
+
+def calculate_config_hash(config: dict, legacy: bool = False) -> str:
+    """Calculate a hash of the configuration, excluding volatile keys.
 
+    :param config: the configuration to hash
+    :param legacy: if set, hash the round-trip YAML dump that was used by older
+        versions of mots, instead of the canonical JSON serialization
+
+    The canonical serialization ignores comments, anchors, formatting and key order,
+    so only actual changes in the configuration change its hash.
+    """
     # Exclude hashes and updated timestamp from hash generation
-    original_hashes = config.pop("hashes", {})
-    hashes = {}
-    config.pop("updated_at", None)
+    volatile_keys = ("hashes", "updated_at")
+
+    if legacy:
+        # Copy the config itself, since comments are part of the dump.
+        config = config.copy()
+        for key in volatile_keys:
+            config.pop(key, None)
+        with io.BytesIO() as stream:
+            get_yaml().dump(config, stream)
+            return _sha1(stream.getbuffer()).hexdigest()
+
+    digest = _sha1()
+    for chunk in _iter_canonical_json(config, exclude=volatile_keys):
+        digest.update(chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+
+_canonical_json = json.JSONEncoder(
+    sort_keys=True,
+    ensure_ascii=False,
+    separators=(",", ":"),
+    default=str,
+)
 
-    # Write actual config yaml dump to stream.
-    with io.StringIO() as stream:
-        yaml.dump(config, stream)
-        content = stream.getvalue()
 
-    config_hash = hashlib.sha1(content.encode("utf-8")).hexdigest()
-    hashes["config"] = config_hash
+def _iter_canonical_json(config: dict, exclude: Collection[str] = ()) -> Iterator[str]:
+    """Serialize a configuration to canonical JSON, in chunks.
 
-    if "export" in config:
-        hashes["export"] = hashlib.sha1(export).hexdigest()
+    Concatenating the chunks results in the same string as encoding the whole
+    configuration at once. Each top level value is encoded separately with the C
+    encoder, which `json.dump` does not use when streaming to a file.
+    """
+    encode = _canonical_json.encode
+    yield "{"
+    for i, key in enumerate(sorted(key for key in config if key not in exclude)):
+        yield f"{',' if i else ''}{encode(key)}:{encode(config[key])}"
+    yield "}"
+
+
+def calculate_hashes(
+    config: dict,
+    export: bytes | BinaryIO | None,
+    which: Collection[str] = ("config", "export"),
+) -> tuple[dict, dict]:
+    """Calculate hashes of the configuration and the export file.
+
+    :param config: the configuration to hash
+    :param export: the exported directory, either as bytes or as a binary file
+    :param which: the hashes to calculate, any of "config" and "export"
+    :returns: the hashes stored in the configuration, and the calculated hashes
+    """
+    original_hashes = config.get("hashes", {})
+    hashes = {}
+
+    if "config" in which:
+        hashes["config"] = calculate_config_hash(config)
+
+    if "export" in which and "export" in config:
+        if isinstance(export, bytes):
+            hashes["export"] = _sha1(export).hexdigest()
+        else:
+            hashes["export"] = _file_digest(export)
 
     return original_hashes, hashes
 
 
+def get_bmo_data(people: list, use_cache: bool = True, refresh: bool = False) -> dict:
+    """Fetch user data from Bugzilla, see :func:`mots.bmo.get_bmo_data`."""
+    # Importing mots.bmo imports requests, which is slow, so only do it when needed.
+    from mots.bmo import get_bmo_data
+
+    return get_bmo_data(people, use_cache=use_cache, refresh=refresh)
+
+
 def raise_if_nick_is_invalid(person):
     """Check if provided person dictionary is valid."""
     if "bmo_id" not in person and person.get("nick") not in ALLOWED_NICK_ONLY:
@@ -195,7 +423,13 @@ def raise_if_nick_is_invalid(person):
         )
 
 
-def clean(file_config: FileConfig, write: bool = True, refresh: bool = True):
+def clean(
+    file_config: FileConfig,
+    write: bool = True,
+    refresh: bool = True,
+    use_cache: bool = True,
+    write_export: bool = False,
+):
     """Clean and re-sort configuration file.
 
     Load configuration from disk, sort modules and submodules by `machine_name`. If
@@ -204,24 +438,52 @@ def clean(file_config: FileConfig, write: bool = True, refresh: bool = True):
 
     :param file_config: an instance of :class:`FileConfig`
     :param write: if set to `True`, writes changes to disk.
+    :param refresh: if set to `True`, all people are refreshed with data fetched from
+        Bugzilla, bypassing cached data.
+    :param use_cache: if set to `False`, cached Bugzilla data is not used.
+    :param write_export: if set to `True`, also writes the export to the path set in
+        the configuration (relative to the working directory, as in `mots export`),
+        using the same content that is hashed.
     """
-    people_keys = ("owners", "peers")
-    emeritus_keys = [f"{k}_emeritus" for k in people_keys]
+    from mots.export import export_to_format
+    from ruamel.yaml.comments import CommentedMap
+
+    # The configuration is written back to disk, so comments and anchors are kept.
     file_config.load()
     directory = Directory(file_config)
-    directory.load()
 
     people = list(file_config.config["people"])
 
-    bmo_data = get_bmo_data(people)
-    updated_people = People(people, bmo_data)
+    # People that are only referenced in modules are added to the directory later on,
+    # so include them in the same request to Bugzilla as everyone else.
+    known_ids = {person.get("bmo_id") for person in people}
+    new_people = [
+        person
+        for _, _, people_list in _iter_people_lists(file_config.config["modules"])
+        for person in people_list
+        if isinstance(person, dict)
+        and "bmo_id" in person
+        and person["bmo_id"] not in known_ids
+    ]
+
+    # Fetch data from Bugzilla while the directory index is loaded from the filesystem.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        bmo_future = executor.submit(
+            get_bmo_data, people + new_people, use_cache=use_cache, refresh=refresh
+        )
+        directory.load_index()
+        bmo_data = bmo_future.result()
+    # The same Bugzilla data is shared by the directory and the updated people list.
+    directory.load_people(bmo_data)
+    updated_people = directory.people
 
     people_to_sync = set(person["bmo_id"] for person in people if "nick" not in person)
 
     if refresh:
         # Use the updated list that was synchronized with Bugzilla.
         logger.info("Refreshing all people entries from Bugzilla.")
-        file_config.config["people"] = updated_people.serialized
+        # Copy the list, since the directory keeps adding to its own list of people.
+        file_config.config["people"] = list(updated_people.serialized)
     else:
         # Use the original people list, and update entries only where needed.
         logger.warning("Only synchronizing new people with Bugzilla.")
@@ -235,108 +497,126 @@ def clean(file_config: FileConfig, write: bool = True, refresh: bool = True):
                 person.update(updated_people_dict[person["bmo_id"]])
         file_config.config["people"] = people
 
-    for i, module in enumerate(file_config.config["modules"]):
+    # Synchronize new people the same way, before they are added to the directory.
+    updated_new_people = People(new_people, bmo_data).serialized
+    for person, updated_person in zip(new_people, updated_new_people):
+        if refresh or "nick" not in person:
+            person.update(updated_person)
+
+    modules = file_config.config["modules"]
+    for module in modules:
         if "machine_name" not in module:
             module["machine_name"] = generate_machine_readable_name(module["name"])
 
-        for emeritus_key in emeritus_keys:
-            if not (
-                "meta" in module
-                and module["meta"]
-                and emeritus_key in module["meta"]
-                and module["meta"][emeritus_key]
-            ):
-                continue
-            for i, person in enumerate(module["meta"][emeritus_key]):
-                if not isinstance(person, dict):
-                    continue
-                reference_anchor_for_module(
-                    i, person, emeritus_key, file_config, directory, module
-                )
-
-        for key in people_keys:
-            if key not in module or not module[key]:
-                continue
-            for i, person in enumerate(module[key]):
-                if "bmo_id" not in person:
-                    raise_if_nick_is_invalid(person)
-                    continue
-                reference_anchor_for_module(
-                    i, person, key, file_config, directory, module
-                )
-
-        # Do the same for submodules.
-        if "submodules" in module and module["submodules"]:
-            module["submodules"].sort(key=lambda x: x["name"])
-            for submodule in module["submodules"]:
-
-                for emeritus_key in emeritus_keys:
-                    if not (
-                        "meta" in submodule
-                        and submodule["meta"]
-                        and emeritus_key in submodule["meta"]
-                        and submodule["meta"][emeritus_key]
-                    ):
-                        continue
-                    for i, person in enumerate(submodule["meta"][emeritus_key]):
-                        if not isinstance(person, dict):
-                            continue
-                        reference_anchor_for_module(
-                            i,
-                            person,
-                            emeritus_key,
-                            file_config,
-                            directory,
-                            submodule,
-                        )
-
-                for key in people_keys:
-                    if key not in submodule or not submodule[key]:
-                        continue
-                    for i, person in enumerate(submodule[key]):
-                        if "bmo_id" not in person:
-                            raise_if_nick_is_invalid(person)
-                            continue
-                        reference_anchor_for_module(
-                            i, person, key, file_config, directory, submodule
-                        )
+        submodules = module.get("submodules")
+        if submodules:
+            submodules.sort(key=lambda x: x["name"])
+            for submodule in submodules:
                 if "machine_name" not in submodule:
                     submodule["machine_name"] = generate_machine_readable_name(
                         submodule["name"]
                     )
 
+    for module, key, people_list in _iter_people_lists(modules):
+        emeritus = key.endswith("_emeritus")
+        for i, person in enumerate(people_list):
+            if emeritus and not isinstance(person, dict):
+                continue
+            if not emeritus and "bmo_id" not in person:
+                raise_if_nick_is_invalid(person)
+                continue
+            reference_anchor_for_module(i, person, key, file_config, directory, module)
+
     file_config.config["modules"].sort(key=lambda x: x["machine_name"])
     file_config.config.yaml_set_start_comment(f"{MPL2}\n\n{QUICK_START_BLURB}")
     if write:
-        # Write all changes.
-        file_config.write()
-
-        # Reload changes from disk so we can reset all anchors.
-        file_config.load()
-
-        nicks = []
-        file_config.config["people"].sort(
-            key=lambda person: person.get("nick", "").lower()
-        )
-        for person in file_config.config["people"]:
+        # Anchors can only be set on round-trip mappings, but people that were
+        # refreshed or added are plain dictionaries that may be referenced by modules.
+        # Convert them in place, instead of writing and reloading the file.
+        people = file_config.config["people"]
+        converted = {}
+        for i, person in enumerate(people):
+            if not isinstance(person, CommentedMap):
+                converted[id(person)] = people[i] = CommentedMap(person)
+        if converted:
+            _replace_referenced_people(file_config.config["modules"], converted)
+
+        nicks = set()
+        people.sort(key=lambda person: person.get("nick", "").lower())
+        for person in people:
             machine_readable_nick = generate_machine_readable_name(
                 person.get("nick", ""), keep_case=True
             )
             if machine_readable_nick in nicks or not machine_readable_nick:
                 continue
-            nicks.append(machine_readable_nick)
+            nicks.add(machine_readable_nick)
+            anchor = person.yaml_anchor()
+            if (
+                anchor
+                and anchor.value == machine_readable_nick
+                and not anchor.always_dump
+            ):
+                # Anchor was already set, e.g. when cleaning an already clean file.
+                continue
             person.yaml_set_anchor(machine_readable_nick)
 
         if "export" in file_config.config and "format" in file_config.config["export"]:
             export = export_to_format(
                 directory, file_config.config["export"]["format"]
             ).encode("utf-8")
+            if write_export and "path" in file_config.config["export"]:
+                # Like `mots export`, resolve the path from the working directory.
+                _write_export(Path(file_config.config["export"]["path"]), export)
         else:
             export = None
         hashes = calculate_hashes(file_config.config, export)[1]
         file_config.write(hashes)
 
 
+def _write_export(path: Path, export: bytes):
+    """Write the export to disk, replacing the existing file at once."""
+    logger.info(f"Writing output to specified file path ({path})...")
+    temp_path = path.with_name(f".{path.name}.tmp")
+    temp_path.write_bytes(export)
+    os.replace(temp_path, path)
+
+
+def _iter_people_lists(modules: list[dict]) -> Iterator[tuple[dict, str, list]]:
+    """Yield all non-empty lists of people in modules and their submodules.
+
+    :param modules: a list of modules, including any submodules
+    :returns: tuples of the module, the key (e.g. "peers" or "owners_emeritus") and
+        the list of people
+    """
+    people_keys = ("owners", "peers")
+    for module in modules:
+        meta = module.get("meta")
+        if meta:
+            for key in people_keys:
+                people_list = meta.get(f"{key}_emeritus")
+                if people_list:
+                    yield module, f"{key}_emeritus", people_list
+
+        for key in people_keys:
+            people_list = module.get(key)
+            if people_list:
+                yield module, key, people_list
+
+        yield from _iter_people_lists(module.get("submodules") or ())
+
+
+def _replace_referenced_people(modules: list[dict], replacements: dict[int, dict]):
+    """Replace references to people in modules and submodules, by object identity.
+
+    :param modules: a list of modules, including any submodules
+    :param replacements: a mapping of `id(person)` to the replacement person
+    """
+    for _, _, people_list in _iter_people_lists(modules):
+        for i, person in enumerate(people_list):
+            if id(person) in replacements:
+                people_list[i] = replacements[id(person)]
+
+
 def validate(config: dict, repo_path: str) -> list[str] | None:
     """Validate the current state of the config file.
 
@@ -347,20 +627,26 @@ def validate(config: dict, repo_path: str) -> list[str] | None:
     :raises ValidationError: if any validation errors are detected
     """
     # Validate that config has all the required keys.
-    required_keys = ("repo", "created_at", "updated_at", "modules")
-    keys_diff = required_keys - config.keys()
+    keys_diff = REQUIRED_KEYS - config.keys()
     if len(keys_diff) != 0:
-        raise ValidationError(f"{keys_diff} missing from configuration file.")
+        raise ValidationError(f"{set(keys_diff)} missing from configuration file.")
 
     modules = config["modules"]
 
-    # Count machine name repetitions in a defaultdict.
-    machine_names = defaultdict(int)
-    for module in modules:
-        machine_names[module["machine_name"]] += 1
-        if "submodules" in module and module["submodules"]:
-            for submodule in module["submodules"]:
-                machine_names[submodule["machine_name"]] += 1
+    # Count machine name repetitions across modules and submodules first, since this
+    # is much cheaper than instantiating and validating each module.
+    machine_names = Counter(
+        chain.from_iterable(
+            chain(
+                (module["machine_name"],),
+                (
+                    submodule["machine_name"]
+                    for submodule in module.get("submodules") or ()
+                ),
+            )
+            for module in modules
+        )
+    )
 
     machine_names = {name: count for name, count in machine_names.items() if count > 1}
     if machine_names:
@@ -382,7 +668,11 @@ def validate(config: dict, repo_path: str) -> list[str] | None:
 
 
 def add(
-    new_module: dict, file_config: FileConfig, parent: str = None, write: bool = True
+    new_module: dict,
+    file_config: FileConfig,
+    parent: str = None,
+    write: bool = True,
+    reload: bool = True,
 ):
     """Add a new module to the configuration.
 
@@ -390,20 +680,26 @@ def add(
     :param file_config: an instance of :class:`FileConfig`
     :param parent: the machine name of the parent module if applicable
     :param write: if set to `True`, writes changes to disk
+    :param reload: if set to `False`, the configuration already loaded in
+        `file_config` is used, so that many modules can be added before writing
     """
-    file_config.load()
+    if reload or file_config.config is None:
+        file_config.load()
     modules = file_config.config["modules"]
     serialized = Module(**new_module, repo_path=file_config.repo_path).serialize()
 
     if parent:
-        for module in modules:
-            if module["machine_name"] == parent:
-                if "submodules" not in module or not module["submodules"]:
-                    module["submodules"] = []
-                module["submodules"].append(serialized)
-                break
+        module = file_config.modules_by_machine_name.get(parent)
+        if module is not None:
+            submodules = module.get("submodules")
+            if not submodules:
+                submodules = module["submodules"] = []
+            submodules.append(serialized)
     else:
         modules.append(serialized)
+        file_config.modules_by_machine_name.setdefault(
+            serialized["machine_name"], serialized
+        )
 
     if write:
         file_config.write()
@@ -5,16 +5,23 @@
 """Directory classes for mots."""
 from __future__ import annotations
 
-import copy
-from collections import defaultdict
-from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import cached_property
 from itertools import chain
+from pathlib import Path
+import hashlib
 import logging
+import os
+import pickle
+import sys
+import time
+from mots import __version__
 from mots.module import Module
+from mots.settings import settings
 from mots.utils import parse_real_name
 
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Iterator, Optional
 
 if TYPE_CHECKING:
     from mots.config import FileConfig
@@ -22,6 +29,10 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# The number of seconds by which file change times may precede the index load time,
+# and still be considered changed since the index was loaded.
+INDEX_TIME_MARGIN = 1
+
 
 class Directory:
     """Path indexer.
@@ -30,18 +41,31 @@ class Directory:
     instance, it parses the configuration and loads all modules into the instance. In
     order to use the rest of the methods provided by this class, the
     :func:`load <mots.directory.Directory.load>` method must be called first.
+
+    Once loaded, :attr:`index` maps absolute :class:`pathlib.Path` instances in the
+    repo to the modules that they belong to.
     """
 
     def __init__(self, config: "FileConfig"):
         self.config_handle = config
-        self.reset_config()
+        if config.config is None:
+            # The directory does not write the configuration, so it does not need to
+            # be loaded with the slower round-trip loader.
+            config.load_fast()
+        self.reset_config(reload=False)
 
         self.index = None
+        self.indexed_at = None
         self.people = None
 
-    def reset_config(self):
-        """Load config and refresh modules, etc..."""
-        self.config_handle.load()
+    def reset_config(self, reload: bool = True):
+        """Load config and refresh modules, etc...
+
+        :param reload: if set to `False`, the configuration already loaded in the
+            config handle is used
+        """
+        if reload:
+            self.config_handle.load()
 
         self.repo_path = self.config_handle.repo_path
         self.modules = [
@@ -49,57 +73,79 @@ class Directory:
             for m in self.config_handle.config["modules"]
         ]
 
-        self.modules_by_machine_name = {}
-        for module in self.modules:
-            self.modules_by_machine_name[module.machine_name] = module
+        self.modules_by_machine_name = {
+            module.machine_name: module for module in self.modules
+        }
 
         self.description = self.config_handle.config.get("description", "")
 
-    def load(self, full_paths: bool = False):
+    def load(self, full_paths: bool = False, bmo_data: dict | None = None):
         """Populate file path and people indexes.
 
         :param full_paths: when true, loads all repo paths in filesystem into index.
+        :param bmo_data: Bugzilla data, by BMO ID, to update the people directory with
 
         This method should be called any time there are changes in the filesystem. For
         example, if the directory index is loaded before a patch is applied, then any
         new files that are added, removed, or moved, may not resolve correctly.
         """
-        self.index = defaultdict(list)
+        self.load_index(full_paths)
+        self.load_people(bmo_data)
+
+    def load_index(self, full_paths: bool = False):
+        """Populate file path index.
+
+        :param full_paths: when true, loads all repo paths in filesystem into index.
+        """
+        self.indexed_at = time.time()
+        index = {}
 
         if full_paths:
             # Make sure all existing paths have an entry in the index.
             logger.debug("Loading paths into index...")
-            for path in self.repo_path.glob("**/*"):
-                if path.relative_to(self.repo_path).parts[0] in (".hg", ".git"):
-                    continue
-                self.index[path] = list()
-            logger.debug(f"{len(self.index)} paths loaded.")
-
+            for path in _walk_parallel(self.repo_path, exclude=(".hg", ".git")):
+                index[path] = []
+            logger.debug(f"{len(index)} paths loaded.")
+
+        # Patterns are often repeated across modules (e.g. an exclude in one module
+        # and an include in another), so only expand each pattern once.
+        glob_cache = {}
+        # Submodule paths are also needed to exclude them from their parent module.
+        paths_cache = {}
+        # Paths of modules that exclude paths defined in other modules.
+        exclusive_paths = set()
         for module in self.modules:
             if module.submodules:
                 # Start with more specific submodule definitions if present.
                 for submodule in module.submodules:
-                    logger.debug(f"Updating index for {submodule.machine_name}...")
-                    for path in submodule.calculate_paths():
-                        self.index[path].append(submodule)
-            logger.debug(f"Updating index for {module.machine_name}...")
+                    logger.debug("Updating index for %s...", submodule.machine_name)
+                    paths = submodule.calculate_paths(glob_cache, paths_cache)
+                    for path in paths:
+                        index.setdefault(path, []).append(submodule)
+                    if submodule.exclude_module_paths:
+                        exclusive_paths.update(paths)
+            logger.debug("Updating index for %s...", module.machine_name)
             # Add broader module definitions.
-            for path in module.calculate_paths():
-                self.index[path].append(module)
+            paths = module.calculate_paths(glob_cache, paths_cache)
+            for path in paths:
+                index.setdefault(path, []).append(module)
+            if module.exclude_module_paths:
+                exclusive_paths.update(paths)
 
         # Filter out modules that specifically exclude paths defined in other modules.
-        for path in self.index.keys():
-            modules = self.index[path]
+        for path in exclusive_paths:
+            modules = index[path]
             if len(modules) > 1:
-                self.index[path] = [m for m in modules if not m.exclude_module_paths]
-        self.index = dict(self.index)
+                modules[:] = [m for m in modules if not m.exclude_module_paths]
+        self.index = index
 
-        self.load_people()
+    def load_people(self, bmo_data: dict | None = None):
+        """Load people directory from config handle.
 
-    def load_people(self):
-        """Load people directory from config handle."""
-        people = list(self.config_handle.config["people"])
-        self.people = People(people, {})
+        :param bmo_data: Bugzilla data, by BMO ID, to update the people directory with
+        """
+        # People copies each person, so the configured list does not need copying.
+        self.people = People(self.config_handle.config["people"], bmo_data or {})
 
     def query(self, *paths: str) -> "QueryResult":
         """Query given paths and return a list of corresponding modules.
@@ -109,37 +155,220 @@ class Directory:
         """
         result = {}
         rejected = []
-        for path in paths:
-            if not (self.repo_path / path).exists():
+        full_paths = [self.repo_path / path for path in paths]
+        existing = _existing_paths(full_paths)
+        for path, full_path in zip(paths, full_paths):
+            if full_path not in existing:
                 logger.warning(f"Path {path} does not exist, skipping.")
                 rejected.append(path)
                 continue
-            result[path] = self.index.get(self.repo_path / path, list())
-        logger.debug(f"Query {paths} resolved to {result}.")
+            result[path] = self.index.get(full_path, list())
+        logger.debug("Query %s resolved to %s.", paths, result)
 
         return QueryResult(result, rejected)
 
+    def changed_since_index(self, *paths: str) -> bool:
+        """Return `True` if any of the given paths changed after the index was loaded.
+
+        :param paths: a string representing a path within the repo
+
+        The change time of a file is also updated when it is created or moved, so this
+        detects paths that may be missing from an index loaded earlier (e.g. a cached
+        index). Paths that do not exist are ignored.
+        """
+        if self.indexed_at is None:
+            return True
+        # Filesystem timestamps can lag slightly behind the system clock.
+        threshold = self.indexed_at - INDEX_TIME_MARGIN
+        for path in paths:
+            try:
+                if os.stat(self.repo_path / path).st_ctime > threshold:
+                    return True
+            except OSError:
+                continue
+        return False
+
     @property
     def peers_and_owners(self):
         """Return a sorted list of all peers and owners, excluding aliases."""
-        all_modules = self.modules
-        all_submodules = list(chain(*[module.submodules for module in all_modules]))
-        modules_and_submodules = all_modules + all_submodules
-
-        peers_and_owners = set()
+        modules_and_submodules = chain(
+            self.modules, *(module.submodules for module in self.modules)
+        )
 
         # NOTE: aliases are free-form text entires that do not link back to a Bugzilla
         # ID. Records without a bmo_id key are treated as such.
+        peers_and_owners = {
+            person["bmo_id"]
+            for module in modules_and_submodules
+            for person in chain(module.peers, module.owners)
+            if "bmo_id" in person
+        }
+        return sorted(peers_and_owners)
+
+
+def _existing_paths(paths: list[Path]) -> set[Path]:
+    """Return the provided paths that exist.
+
+    Paths that share a parent directory are checked with a single listing of that
+    directory, instead of checking each path separately. Paths that are not listed
+    (e.g. due to a different case on a case-insensitive filesystem) and symbolic links
+    are checked separately.
+    """
+    by_parent = {}
+    for path in paths:
+        by_parent.setdefault(path.parent, []).append(path)
+
+    existing = set()
+    for parent, children in by_parent.items():
+        entries = {}
+        if len(children) > 1:
+            try:
+                with os.scandir(parent) as it:
+                    entries = {entry.name: entry.is_symlink() for entry in it}
+            except OSError:
+                pass
+        for path in children:
+            if entries.get(path.name) is False or path.exists():
+                existing.add(path)
+    return existing
+
+
+def _walk(root: Path, exclude: tuple[str, ...] = ()) -> Iterator[Path]:
+    """Yield all paths under the root directory, recursively.
+
+    Symbolic links to directories are yielded, but not followed.
+
+    :param root: the directory to walk
+    :param exclude: names of entries in the root directory to skip, along with their
+        contents (e.g. version control directories)
+    """
+    stack = [(root, exclude)]
+    while stack:
+        directory, skip = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name in skip:
+                    continue
+                path = directory / entry.name
+                yield path
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((path, ()))
+
 
-        for module in modules_and_submodules:
-            peers_and_owners.update(
-                [
-                    person["bmo_id"]
-                    for person in module.peers + module.owners
-                    if "bmo_id" in person
-                ]
-            )
-        return sorted(list(peers_and_owners))
+def _walk_parallel(root: Path, exclude: tuple[str, ...] = ()) -> list[Path]:
+    """Return all paths under the root directory, walking subdirectories in parallel.
+
+    Walking the filesystem is mostly spent waiting on system calls, during which other
+    threads can run, so each top level directory is walked in a separate thread.
+
+    :param root: the directory to walk
+    :param exclude: names of entries in the root directory to skip, along with their
+        contents (e.g. version control directories)
+    """
+    paths = []
+    directories = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.name in exclude:
+                continue
+            path = root / entry.name
+            paths.append(path)
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(path)
+
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for subpaths in executor.map(lambda d: list(_walk(d)), directories):
+            paths.extend(subpaths)
+    return paths
+
+
+def _index_cache_path(config_path: Path) -> Path:
+    """Return the path of the cached directory for a given config file path.
+
+    The working directory is part of the key, since paths in the index are relative
+    to it when a relative config file path is provided.
+    """
+    key = hashlib.sha256(f"{Path.cwd()}:{config_path}".encode("utf-8")).hexdigest()
+    return settings.INDEX_CACHE_DIRECTORY / f"directory-{key}.pkl"
+
+
+def _repo_head(root: Path) -> str:
+    """Return the commit that `HEAD` points to in a git repo, if it can be found.
+
+    The git metadata is read directly to avoid spawning a subprocess. An empty
+    string is returned when `root` is not a git repo or `HEAD` can not be resolved.
+    """
+    git_dir = root / ".git"
+    try:
+        head = (git_dir / "HEAD").read_text().strip()
+        if not head.startswith("ref: "):
+            # Detached HEAD, this is the commit itself.
+            return head
+        ref = head.split(" ", 1)[1]
+        ref_path = git_dir / ref
+        if ref_path.exists():
+            return ref_path.read_text().strip()
+        for line in (git_dir / "packed-refs").read_text().splitlines():
+            if line.endswith(f" {ref}"):
+                return line.split(" ", 1)[0]
+    except OSError:
+        pass
+    return ""
+
+
+def _index_cache_digest(config_path: Path) -> str:
+    """Return a digest of the config file contents and the current repo commit."""
+    digest = hashlib.sha256(config_path.read_bytes())
+    digest.update(_repo_head(config_path.resolve().parent).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_cached_directory(config_path: Path) -> Directory | None:
+    """Return a previously cached directory if the config file has not changed.
+
+    :param config_path: the path of the repo config file
+
+    The cache is invalidated when the config file contents, the checked out commit
+    or the mots version change. Note that uncommitted changes in the filesystem are
+    not detected, so callers should check queried paths with
+    :meth:`Directory.changed_since_index` and reload the directory if needed.
+    """
+    cache_path = _index_cache_path(config_path)
+    if not cache_path.exists():
+        return None
+
+    digest = _index_cache_digest(config_path)
+    try:
+        with cache_path.open("rb") as f:
+            version, cached_digest, directory = pickle.load(f)
+    except Exception as e:
+        logger.debug(f"Could not load cached directory from {cache_path}: {e}")
+        return None
+
+    if (version, cached_digest) != (__version__, digest):
+        logger.debug(f"Cached directory in {cache_path} is out of date.")
+        return None
+    logger.debug(f"Loaded cached directory from {cache_path}.")
+    return directory
+
+
+def cache_directory(directory: Directory, config_path: Path):
+    """Write a loaded directory to disk so that it can be reused in later runs.
+
+    :param directory: a loaded :class:`Directory` instance
+    :param config_path: the path of the repo config file used to load `directory`
+    """
+    cache_path = _index_cache_path(config_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    digest = _index_cache_digest(config_path)
+
+    # Write to a temporary file first so that concurrent runs never see partial data.
+    temp_path = cache_path.with_suffix(".tmp")
+    with temp_path.open("wb") as f:
+        pickle.dump((__version__, digest, directory), f, pickle.HIGHEST_PROTOCOL)
+    temp_path.replace(cache_path)
+    logger.debug(f"Cached directory in {cache_path}.")
 
 
 class QueryResult:
@@ -153,6 +382,8 @@ class QueryResult:
         "peers",
     }
 
+    __slots__ = ("path_map", *data_keys)
+
     def __init__(
         self,
         result: dict[str, list[Module]] | None = None,
@@ -161,18 +392,20 @@ class QueryResult:
         result = result or {}
         rejected = rejected or []
 
-        data = {k: set() for k in self.data_keys}
+        # Dictionaries are used as ordered sets, so that the results are deduplicated
+        # while keeping the order in which they were found.
+        data = {k: {} for k in self.data_keys}
         self.path_map = result
 
-        for path in self.path_map:
-            data["paths"].add(path)
-            data["modules"].update(self.path_map[path])
+        for path, modules in self.path_map.items():
+            data["paths"][path] = None
+            data["modules"].update(dict.fromkeys(modules))
 
         for module in data["modules"]:
-            data["owners"].update([Person(**o) for o in module.owners])
-            data["peers"].update([Person(**p) for p in module.peers])
+            data["owners"].update(dict.fromkeys(module.owner_people))
+            data["peers"].update(dict.fromkeys(module.peer_people))
 
-        data["rejected_paths"].update(rejected)
+        data["rejected_paths"].update(dict.fromkeys(rejected))
 
         for key in data:
             setattr(self, key, list(data[key]))
@@ -182,21 +415,28 @@ class QueryResult:
         return bool(self.path_map)
 
     def __add__(self, query_result: "QueryResult") -> "QueryResult":
-        """Merge the data from both QueryResult objects."""
-        path_map = self.path_map.copy()
-        path_map.update(query_result.path_map)
-        rejected_paths = set.union(
-            set(self.rejected_paths),
-            set(query_result.rejected_paths),
-        )
-        return QueryResult(path_map, rejected_paths)
+        """Merge the data from both QueryResult objects.
+
+        The data of both results is merged directly, instead of being recalculated
+        from the merged path map.
+        """
+        merged = QueryResult.__new__(QueryResult)
+        merged.path_map = {**self.path_map, **query_result.path_map}
+        for key in self.data_keys:
+            values = chain(getattr(self, key), getattr(query_result, key))
+            setattr(merged, key, list(dict.fromkeys(values)))
+        return merged
 
     def __radd__(self, query_result: "QueryResult") -> "QueryResult":
         """Call self.__add__ since the order of addition does not matter."""
         return self.__add__(query_result)
 
 
-@dataclass
+# Slots reduce the memory used by each person, but are only supported on Python 3.10+.
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class Person:
     """A class representing a person."""
 
@@ -208,6 +448,14 @@ class Person:
         """Return a unique identifier for this person."""
         return self.bmo_id or hash(self.nick)
 
+    def serialize(self) -> dict:
+        """Return a dictionary with this person's information.
+
+        This is equivalent to `dataclasses.asdict`, which is much slower since it
+        recursively copies each field.
+        """
+        return {"bmo_id": self.bmo_id, "name": self.name, "nick": self.nick}
+
 
 class People:
     """A people directory searchable by name, email, or BMO ID."""
@@ -215,32 +463,54 @@ class People:
     def __init__(self, people: list[dict], bmo_data: dict):
         logger.debug(f"Initializing people directory with {len(people)} people...")
 
-        self.people = []
-        self.by_bmo_id = {}
+        # People only contain scalar values, so a shallow copy of each is enough to
+        # leave the original (e.g. round-trip YAML) mappings untouched.
+        self.people = [
+            Person(**self._normalize(dict(person), bmo_data)) for person in people
+        ]
+        self.by_bmo_id = {person.bmo_id: i for i, person in enumerate(self.people)}
+        logger.debug(f"{len(self.people)} people added to roster.")
+
+    @staticmethod
+    def _normalize(person: dict, bmo_data: dict) -> dict:
+        """Normalize a person in place and update it with BMO data if available."""
+        bmo_id = person["bmo_id"] = (
+            int(person["bmo_id"]) if "bmo_id" in person else None
+        )
+        bmo_datum = bmo_data.get(bmo_id)
+        if bmo_datum:
+            # Update person's data base on BMO data.
+            person["nick"] = bmo_datum.get("nick", "")
+
+            parsed_real_name = parse_real_name(bmo_datum["real_name"])
+            person["name"] = parsed_real_name["name"]
+        else:
+            person["name"] = person.get("name", "")
+            person["nick"] = person.get("nick", "")
+        return person
+
+    @cached_property
+    def serialized(self) -> list[dict]:
+        """Return the people in this directory as dictionaries.
+
+        The list is built on first access, since most callers only need the index.
+        """
+        return [person.serialize() for person in self.people]
+
+    def add(self, person: dict):
+        """Add a single person to the end of the directory.
 
-        people = copy.deepcopy(people)
-
-        for i, person in enumerate(people):
-            logger.debug(f"Adding person {person} to roster...")
-
-            bmo_id = person["bmo_id"] = (
-                int(person["bmo_id"]) if "bmo_id" in person else None
-            )
-            if bmo_id in bmo_data and bmo_data[bmo_id]:
-                # Update person's data base on BMO data.
-                bmo_datum = bmo_data[person["bmo_id"]]
-                person["nick"] = bmo_datum.get("nick", "")
-
-                parsed_real_name = parse_real_name(bmo_datum["real_name"])
-                person["name"] = parsed_real_name["name"]
-            else:
-                person["name"] = person.get("name", "")
-                person["nick"] = person.get("nick", "")
-
-            self.people.append(Person(**person))
-            self.by_bmo_id[person["bmo_id"]] = i
-            logger.debug(f"Person {person} added to position {i}.")
-        self.serialized = [asdict(person) for person in self.people]
+        This is equivalent to reinitializing the directory with the person appended to
+        the original list, without reprocessing everyone else.
+        """
+        person = Person(**self._normalize(dict(person), {}))
+        i = len(self.people)
+        self.people.append(person)
+        self.by_bmo_id[person.bmo_id] = i
+        if "serialized" in self.__dict__:
+            # Keep the serialized list up to date if it was already built.
+            self.serialized.append(person.serialize())
+        logger.debug("Person %s added to position %s.", person, i)
 
     def refresh_by_bmo_id(self):
         """Refresh index positions of people by their bugzilla ID."""
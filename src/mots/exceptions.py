@@ -0,0 +1,15 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Exceptions shared between mots modules.
+
+This module must not import any other modules, so that exceptions can be caught
+without importing the modules that raise them.
+"""
+
+
+class MissingBugzillaAPIKey(Exception):
+    """Raised when a Bugzilla API key was not detected in settings."""
+
+    pass
@@ -6,9 +6,12 @@
 
 from __future__ import annotations
 
+from functools import lru_cache
 import logging
+import re
 
 import sys
+from typing import IO, Iterator
 
 if sys.version_info < (3, 9):
     import importlib_resources
@@ -24,23 +27,32 @@ logger = logging.getLogger(__name__)
 
 DEFAULT_LIST_TABLE_INDENT = 8
 
+_RST_SPECIAL_CHARACTERS = "\\*`"
+_MD_SPECIAL_CHARACTERS = "\\`*_{}[]<>()#+-.!|"
+
+# Translation tables that prefix special characters with a backslash, in a single pass
+# (so that backslashes do not need to be escaped first).
+_RST_ESCAPE_TABLE = str.maketrans({c: f"\\{c}" for c in _RST_SPECIAL_CHARACTERS})
+_MD_ESCAPE_TABLE = str.maketrans({c: f"\\{c}" for c in _MD_SPECIAL_CHARACTERS})
+
+# Most values do not contain any special characters, and searching for them is much
+# faster than translating the value.
+_RST_SPECIAL_RE = re.compile(f"[{re.escape(_RST_SPECIAL_CHARACTERS)}]")
+_MD_SPECIAL_RE = re.compile(f"[{re.escape(_MD_SPECIAL_CHARACTERS)}]")
+
 
 def escape_for_rst(value: str) -> str:
     """Escape rst special characters."""
-    # First we must escape backslashes, then everything else.
-    characters = ("\\", "*", "`")
-    for character in characters:
-        value = value.replace(character, f"\\{character}")
-    return value
+    if _RST_SPECIAL_RE.search(value) is None:
+        return value
+    return value.translate(_RST_ESCAPE_TABLE)
 
 
 def escape_for_md(value: str) -> str:
     """Escape rst special characters."""
-    # First we must escape backslashes, then everything else.
-    characters = "\\`*_{}[]<>()#+-.!|"
-    for character in characters:
-        value = value.replace(character, f"\\{character}")
-    return value
+    if _MD_SPECIAL_RE.search(value) is None:
+        return value
+    return value.translate(_MD_ESCAPE_TABLE)
 
 
 def format_link_for_rst(text: str, url: str) -> str:
@@ -103,7 +115,7 @@ def format_people_for_rst(value: list[dict], indent: int) -> str:
     parsed_people = []
     for person in value:
         url = f"{people_base_url}{person['nick']}"
-        if "name" in person and person["name"]:
+        if person.get("name"):
             parsed_person = format_link_for_rst(
                 f"{person['name']} ({person['nick']})", url
             )
@@ -122,7 +134,7 @@ def format_people_for_md(value: list[dict], indent: int) -> str:
     parsed_people = []
     for person in value:
         url = f"{people_base_url}{person['nick']}"
-        if "name" in person and person["name"]:
+        if person.get("name"):
             parsed_person = format_link_for_md(
                 f"{person['name']} ({person['nick']})", url
             )
@@ -142,9 +154,9 @@ def format_emeritus(value: list[dict | str]) -> str:
         if isinstance(person, str):
             parsed.append(person)
         elif isinstance(person, dict):
-            if "name" in person and person["name"]:
+            if person.get("name"):
                 parsed.append(person["name"])
-            elif "nick" in person and person["nick"]:
+            elif person.get("nick"):
                 parsed.append(person["nick"])
     return ", ".join(parsed)
 
@@ -165,12 +177,20 @@ class Exporter:
     """A helper class that exports to various formats."""
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def _get_env() -> jinja2.Environment:
-        """Return a Jinja2 environment preloaded with a FileSystemLoader."""
+        """Return a Jinja2 environment preloaded with a FileSystemLoader.
+
+        The environment is shared between exporters, so that each template is only
+        compiled once. Templates are packaged with mots, so they are not checked for
+        changes once loaded.
+        """
         loader = jinja2.FileSystemLoader(
             searchpath=importlib_resources.files("mots") / "templates"
         )
-        env = jinja2.Environment(loader=loader, trim_blocks=True, lstrip_blocks=True)
+        env = jinja2.Environment(
+            loader=loader, trim_blocks=True, lstrip_blocks=True, auto_reload=False
+        )
         env.filters["escape_for_rst"] = escape_for_rst
         env.filters["format_paths_for_rst"] = format_paths_for_rst
         env.filters["format_people_for_rst"] = format_people_for_rst
@@ -203,6 +223,30 @@ class Exporter:
         out = template.render(directory=self.directory)
         return f"{out.strip()}\n"
 
+    def stream(self, frmt: str) -> Iterator[str]:
+        """Render the template for the given format in chunks.
+
+        The concatenated chunks are identical to the output of the corresponding
+        `_export_to_<format>` method, i.e. stripped and followed by a newline.
+        """
+        template = self._get_template(frmt)
+        started = False
+        pending = ""
+        for chunk in template.generate(directory=self.directory):
+            if not started:
+                chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+                started = True
+            stripped = chunk.rstrip()
+            if not stripped:
+                # Hold on to trailing whitespace until more content follows.
+                pending += chunk
+                continue
+            yield pending + stripped
+            pending = chunk.replace(stripped, "", 1)
+        yield "\n"
+
 
 def export_to_format(directory: Directory, frmt="rst"):
     """Export directory in a specified format."""
@@ -212,3 +256,14 @@ def export_to_format(directory: Directory, frmt="rst"):
 
     exporter = Exporter(directory)
     return getattr(exporter, f"_export_to_{frmt}")()
+
+
+def export_to_stream(directory: Directory, fileobj: IO[str], frmt="rst"):
+    """Export directory in a specified format, writing to an open text file."""
+    supported_formats = ["rst", "md"]
+    if frmt not in supported_formats:
+        raise ValueError(f"{frmt} not one of {supported_formats}.")
+
+    exporter = Exporter(directory)
+    for chunk in exporter.stream(frmt):
+        fileobj.write(chunk)
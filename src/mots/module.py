@@ -6,9 +6,16 @@
 
 from __future__ import annotations
 
+from functools import cached_property
+import glob
 import logging
-from pathlib import Path
+import os
+from pathlib import Path, PurePosixPath
 from pprint import pprint as print
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from mots.directory import Person
 
 logger = logging.getLogger(__name__)
 
@@ -89,38 +96,122 @@ class Module:
         self.owner_names = [owner.get("nick", "") for owner in self.owners]
         self.peer_names = [peer.get("nick", "") for peer in self.peers]
 
-    def calculate_paths(self):
+    @cached_property
+    def owner_people(self) -> list[Person]:
+        """Return the owners of this module as :class:`Person` instances.
+
+        The list is built on first access, so that it is not rebuilt for every query.
+        """
+        from mots.directory import Person
+
+        return [Person(**owner) for owner in self.owners]
+
+    @cached_property
+    def peer_people(self) -> list[Person]:
+        """Return the peers of this module as :class:`Person` instances."""
+        from mots.directory import Person
+
+        return [Person(**peer) for peer in self.peers]
+
+    def calculate_paths(
+        self,
+        glob_cache: dict[str, list[Path]] | None = None,
+        paths_cache: dict[Module, set[Path]] | None = None,
+    ):
         """Calculate paths based on inclusions and exclusions.
 
         Upon calling this method, excluded paths are parsed using ``pathlib.Path.rglob``
         and then subtracted from the included paths, which are parsed in the same way.
 
+        :param glob_cache: an optional dictionary of expanded patterns, shared between
+            calls so that each pattern is only expanded once (e.g. when loading an
+            index for all modules)
+        :param paths_cache: an optional dictionary of calculated paths by module, shared
+            between calls so that the paths of each module are only calculated once
+            (e.g. submodule paths, which are also excluded from their parent module).
+            Paths returned from the cache must not be modified.
         :rtype: set
         """
+        if paths_cache is not None and self in paths_cache:
+            return paths_cache[self]
+        if glob_cache is None:
+            glob_cache = {}
+
         includes = []
         for pattern in self.includes:
-            logger.debug(f"Expanding {pattern} in {self.machine_name}...")
-            expanded = list(self.repo_path.glob(pattern))
+            expanded = self._expand_pattern(pattern, glob_cache)
             logger.debug(
-                f"Pattern {pattern} expanded to {len(expanded)} included path(s)."
+                "Pattern %s expanded to %s included path(s).", pattern, len(expanded)
             )
             includes += expanded
 
         excludes = []
         for pattern in self.excludes:
-            logger.debug(f"Expanding {pattern} in {self.machine_name}...")
-            expanded = list(self.repo_path.glob(pattern))
+            expanded = self._expand_pattern(pattern, glob_cache)
             logger.debug(
-                f"Pattern {pattern} expanded to {len(expanded)} excluded path(s)."
+                "Pattern %s expanded to %s excluded path(s).", pattern, len(expanded)
             )
             excludes += expanded
 
         paths = set(includes) - set(excludes)
         if self.exclude_submodule_paths:
             for submodule in self.submodules:
-                paths -= submodule.calculate_paths()
+                paths -= submodule.calculate_paths(glob_cache, paths_cache)
+        if paths_cache is not None:
+            paths_cache[self] = paths
         return paths
 
+    def _expand_pattern(
+        self, pattern: str, glob_cache: dict[str, list[Path]]
+    ) -> list[Path]:
+        """Return the paths matching a pattern, using previous results if possible."""
+        if pattern not in glob_cache:
+            logger.debug("Expanding %s in %s...", pattern, self.machine_name)
+            paths = self._filter_expanded_ancestor(pattern, glob_cache)
+            if paths is None:
+                paths = list(self.repo_path.glob(pattern))
+            glob_cache[pattern] = paths
+        return glob_cache[pattern]
+
+    def _filter_expanded_ancestor(
+        self, pattern: str, glob_cache: dict[str, list[Path]]
+    ) -> list[Path] | None:
+        """Return the paths matching a recursive pattern, from a broader pattern.
+
+        A pattern such as `a/b/**/*` matches a subset of the paths matched by `a/**/*`
+        or `**/*`. If one of those was already expanded, filter its paths instead of
+        walking the same part of the filesystem again.
+
+        :returns: the matching paths, or `None` if they could not be determined
+        """
+        prefix, recursive, rest = pattern.rpartition("**/*")
+        if not recursive or rest or (prefix and not prefix.endswith("/")):
+            return None
+        parts = PurePosixPath(prefix).parts
+        if any(glob.has_magic(part) or part in (".", "..") for part in parts):
+            return None
+
+        for i in range(len(parts) - 1, -1, -1):
+            ancestor = "/".join(parts[:i] + ("**/*",))
+            if ancestor not in glob_cache:
+                continue
+            # Recursive patterns do not follow symbolic links to directories, so the
+            # broader pattern does not match anything under one.
+            base = self.repo_path.joinpath(*parts[:i])
+            for part in parts[i:]:
+                base = base / part
+                if base.is_symlink():
+                    return None
+            base = f"{base}{os.sep}"
+            logger.debug("Filtering paths of %s to expand %s.", ancestor, pattern)
+            paths = [
+                path for path in glob_cache[ancestor] if str(path).startswith(base)
+            ]
+            # Nothing matched, e.g. if the prefix is in a different case on a
+            # case-insensitive filesystem, so let `pathlib.Path.glob` decide.
+            return paths or None
+        return None
+
     def serialize(self):
         """Return a dictionary with relevant module information.
 
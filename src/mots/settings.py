@@ -15,7 +15,7 @@ import os
 from pathlib import Path
 
 from mots import __version__
-from mots.yaml import yaml
+from mots.yaml import safe_load
 
 HOME_DIRECTORY = Path.home()
 RESOURCE_DIRECTORY = HOME_DIRECTORY / ".mots"
@@ -27,6 +27,10 @@ class Settings:
 
     DEFAULTS = {
         "BUGZILLA_API_KEY": "",
+        "BUGZILLA_CACHE_FILE": RESOURCE_DIRECTORY / "bmo_cache.sqlite",
+        "BUGZILLA_CACHE_TTL": 86400,
+        "BUGZILLA_RATE_BURST": 10,
+        "BUGZILLA_RATE_LIMIT": 5.0,
         "BUGZILLA_URL": "https://bugzilla.mozilla.org/rest",
         "CHECK_PRE_RELEASES": 0,
         "CHECK_FOR_UPDATES": 1,
@@ -34,6 +38,7 @@ class Settings:
         "DEBUG": 0,
         "DEFAULT_CONFIG_FILEPATH": Path("./mots.yaml"),
         "DEFAULT_EXPORT_FORMAT": "rst",
+        "INDEX_CACHE_DIRECTORY": RESOURCE_DIRECTORY / "cache",
         "LOG_BACKUPS": 5,
         "LOG_FILE": RESOURCE_DIRECTORY / "mots.log",
         "LOG_MAX_SIZE": 1024 * 1024 * 50,
@@ -44,6 +49,8 @@ class Settings:
         "RESOURCE_DIRECTORY": RESOURCE_DIRECTORY,
         "SEARCHFOX_BASE_URL": "https://searchfox.org",
         "PHABRICATOR_BASE_URL": "https://phabricator.services.mozilla.com",
+        "UPDATE_CHECK_INTERVAL": 60 * 60 * 24,
+        "UPDATE_CHECK_STAMP_FILE": RESOURCE_DIRECTORY / ".last_update_check",
         "USER_AGENT": f"mots/{__version__}",
         "VERSION": __version__,
     }
@@ -77,7 +84,7 @@ class Settings:
 
 if OVERRIDES_FILE.exists():
     with OVERRIDES_FILE.open("r") as f:
-        overrides = yaml.load(f) or {}
+        overrides = safe_load(f) or {}
 else:
     overrides = {}
 settings = Settings(**overrides)
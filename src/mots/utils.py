@@ -6,13 +6,15 @@
 
 from __future__ import annotations
 
+from functools import lru_cache
+from itertools import islice
 from packaging.version import Version
 from pathlib import Path
 from xml.etree import ElementTree
 import logging
 import re
-
-import requests
+import sys
+import time
 
 from mots import __version__
 
@@ -21,6 +23,7 @@ logger = logging.getLogger(__name__)
 REAL_NAME_RE = re.compile(r"^(?P<name>[\w\ \-]*)?\ ?(?P<info>\W.*)?$")
 
 
+@lru_cache(maxsize=4096)
 def generate_machine_readable_name(display_name, keep_case=False):
     """Turn spaces into underscores, and lower the case. Strip all but alphanumerics."""
     words = [w.strip() for w in display_name.split(" ")]
@@ -33,6 +36,12 @@ def generate_machine_readable_name(display_name, keep_case=False):
     return "_".join([w for w in alnum_words if w])
 
 
+def chunk_list(items: list, size: int) -> list[list]:
+    """Split a list into consecutive lists of at most `size` items."""
+    iterator = iter(items)
+    return list(iter(lambda: list(islice(iterator, size)), []))
+
+
 def get_list_input(text: str):
     """Parse comma separated list in user input into a list.
 
@@ -67,12 +76,31 @@ def touch_if_not_exists(path: Path):
         logger.warning(f"{path} exists but is not a file.")
 
 
+def update_check_due(stamp: Path, interval: int) -> bool:
+    """Return whether an automatic update check should run.
+
+    Checks only run in interactive sessions, and at most once every `interval`
+    seconds, based on the modification time of the `stamp` file. Callers must touch
+    the `stamp` file once a check completes successfully.
+    """
+    if not sys.stdout.isatty():
+        return False
+    try:
+        if time.time() - stamp.stat().st_mtime < interval:
+            return False
+    except FileNotFoundError:
+        pass
+    return True
+
+
 def check_for_updates(include_pre_releases: bool = False) -> Version | None:
     """
     Show a message if there is a newer version available.
 
     This method checks the RSS feed on PyPI.
     """
+    import requests
+
     URL = "https://pypi.org/rss/project/mots/releases.xml"
     response = requests.get(URL)
     result = ElementTree.fromstring(response.content)
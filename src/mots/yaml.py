@@ -2,18 +2,28 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
-"""Module to load YAML parser."""
+"""Module to load YAML parser.
+
+YAML libraries are slow to import, so they are only imported when first needed.
+"""
+
+from __future__ import annotations
 
 import logging
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-from ruamel.yaml import YAML
+if TYPE_CHECKING:
+    from ruamel.yaml import YAML
 
 logger = logging.getLogger(__name__)
 
 
 def load_yaml() -> YAML:
-    """Load and return a ruamel.yaml.YAML instance."""
-    yaml = YAML()
+    """Load and return a round-trip ruamel.yaml.YAML instance."""
+    from ruamel.yaml import YAML
+
+    yaml = YAML(typ="rt")
     yaml.indent(
         mapping=2,
         sequence=4,
@@ -22,4 +32,75 @@ def load_yaml() -> YAML:
     return yaml
 
 
-yaml = load_yaml()
+@lru_cache(maxsize=None)
+def get_yaml() -> YAML:
+    """Return the shared round-trip ruamel.yaml.YAML instance."""
+    return load_yaml()
+
+
+def __getattr__(name: str):
+    """Create the shared round-trip `yaml` instance on first access."""
+    if name == "yaml":
+        return get_yaml()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@lru_cache(maxsize=None)
+def _libyaml():
+    """Return the PyYAML module if its LibYAML bindings are available."""
+    try:
+        # PyYAML's LibYAML bindings are optional, and much faster than ruamel.yaml when
+        # comments and formatting do not need to be preserved.
+        import yaml
+        from yaml import CSafeDumper, CSafeLoader  # noqa: F401
+    except ImportError:
+        logger.debug("LibYAML bindings not available, falling back to ruamel.yaml.")
+        return None
+    return yaml
+
+
+@lru_cache(maxsize=None)
+def _safe_yaml() -> YAML:
+    """Return a safe ruamel.yaml.YAML instance.
+
+    The round-trip loader is always pure Python, whereas the safe loader uses the
+    ruamel.yaml.clib C extension when it is installed.
+    """
+    from ruamel.yaml import YAML
+
+    return YAML(typ="safe", pure=False)
+
+
+def load_fast(stream):
+    """Load YAML data that does not need to be round-tripped (e.g. a read-only config).
+
+    Unlike :func:`safe_load`, this always uses ruamel.yaml, so that scalars are resolved
+    as YAML 1.2, the same way as with the round-trip loader. PyYAML implements YAML 1.1,
+    where e.g. `on`, `no` and `1:20` are not strings.
+    """
+    return _safe_yaml().load(stream)
+
+
+def safe_load(stream):
+    """Load simple YAML data (e.g. settings) that does not need to be round-tripped.
+
+    Uses the LibYAML bindings if available, and ruamel.yaml's safe loader otherwise.
+    Note that the LibYAML bindings implement YAML 1.1, so this must not be used to load
+    configuration files, see :func:`load_fast`.
+    """
+    libyaml = _libyaml()
+    if libyaml is not None:
+        return libyaml.load(stream, Loader=libyaml.CSafeLoader)
+    return _safe_yaml().load(stream)
+
+
+def safe_dump(data, stream):
+    """Dump simple YAML data (e.g. settings) that does not need to be round-tripped.
+
+    Uses the LibYAML bindings if available, and ruamel.yaml otherwise.
+    """
+    libyaml = _libyaml()
+    if libyaml is not None:
+        libyaml.dump(data, stream, Dumper=libyaml.CSafeDumper, sort_keys=False)
+    else:
+        get_yaml().dump(data, stream)
@@ -0,0 +1,244 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Tests for bmo module."""
+
+from unittest import mock
+import json
+
+import pytest
+
+import requests
+
+from mots.bmo import BMOClient, get_bmo_data, _DiskCache, _TokenBucket, _TTLCache
+from mots.settings import settings
+
+
+def mock_response(data: dict, status_code: int = 200) -> mock.MagicMock:
+    response = mock.MagicMock()
+    response.status_code = status_code
+    response.ok = status_code < 400
+    response.headers = {}
+    response.content = json.dumps(data).encode("utf-8")
+    return response
+
+
+@pytest.fixture(autouse=True)
+def clear_bmo_cache(tmp_path, monkeypatch):
+    BMOClient._cache.clear()
+    monkeypatch.setattr(settings, "BUGZILLA_CACHE_FILE", tmp_path / "bmo.sqlite")
+
+
+@mock.patch("mots.bmo.time.sleep")
+def test__TokenBucket_burst_does_not_block(sleep):
+    bucket = _TokenBucket(capacity=3, refill_per_sec=1)
+    for _ in range(3):
+        bucket.consume()
+    assert sleep.call_count == 0
+
+
+@mock.patch("mots.bmo.time.sleep")
+def test__TokenBucket_blocks_when_exhausted(sleep):
+    bucket = _TokenBucket(capacity=1, refill_per_sec=1000)
+    bucket.consume()
+    bucket.consume()
+    assert sleep.call_count == 1
+    assert 0 < sleep.call_args[0][0] <= 0.001
+
+
+@mock.patch("mots.bmo.requests.Session.get")
+def test_BMOClient_get_users_by_emails(get):
+    get.return_value = mock_response(
+        {
+            "users": [
+                {"id": 1, "name": "jill@example.com", "nick": "jill"},
+                {"id": 2, "name": "otis@example.com", "nick": "otis"},
+            ]
+        }
+    )
+    client = BMOClient(token="test")
+    result = client.get_users_by_emails(["jill@example.com", "otis@example.com"])
+    assert get.call_count == 1
+    assert get.call_args[1]["params"]["names"] == [
+        "jill@example.com",
+        "otis@example.com",
+    ]
+    assert result["otis@example.com"]["id"] == 2
+
+
+@mock.patch("mots.bmo.requests.Session.get")
+def test_BMOClient_reuses_session(get):
+    get.return_value = mock_response({"users": [{"id": 1}]})
+    with BMOClient(token="test") as client:
+        session = client._session
+        client.get_users_by_ids([1])
+        client.get_matches("jill")
+        assert client._session is session
+        assert session.headers["X-BUGZILLA-API-KEY"] == "test"
+    assert get.call_count == 2
+
+
+@mock.patch("mots.bmo.time.monotonic")
+def test__TTLCache_expiry_and_eviction(monotonic):
+    monotonic.return_value = 0
+    cache = _TTLCache(ttl=10, maxsize=2)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.set(3, "c")
+    assert cache.get(1) is None
+    assert cache.get(2) == "b"
+
+    monotonic.return_value = 11
+    assert cache.get(2) is None
+    assert cache.get(3) is None
+
+    cache.set_many({4: "d", 5: "e", 6: "f"})
+    assert cache.get(4) is None
+    assert cache.get(5) == "e"
+    assert cache.get(6) == "f"
+
+
+@mock.patch("mots.bmo.requests.Session.get")
+def test_BMOClient_get_users_by_ids_cached(get):
+    get.return_value = mock_response(
+        {"users": [{"id": 1, "nick": "jill"}, {"id": 2, "nick": "otis"}]}
+    )
+    client = BMOClient(token="test")
+    assert set(client.get_users_by_ids([1, 2])) == {1, 2}
+    assert get.call_count == 1
+
+    # A new client shares the same cache.
+    get.return_value = mock_response({"users": [{"id": 3, "nick": "jane"}]})
+    result = BMOClient(token="test").get_users_by_ids([1, 2, 3])
+    assert get.call_count == 2
+    assert get.call_args[1]["params"]["ids"] == [3]
+    assert result[1]["nick"] == "jill"
+    assert result[3]["nick"] == "jane"
+
+
+@mock.patch("mots.bmo.time.time")
+def test__DiskCache(time, tmp_path):
+    time.return_value = 0
+    cache = _DiskCache(tmp_path / "cache" / "bmo.sqlite", ttl=10)
+    cache.set_many({1: {"id": 1, "nick": "jill"}, 2: {"id": 2, "nick": "otis"}})
+    assert cache.get_many([1, 2, 3]) == {
+        1: {"id": 1, "nick": "jill"},
+        2: {"id": 2, "nick": "otis"},
+    }
+
+    time.return_value = 11
+    assert cache.get_many([1, 2]) == {}
+    assert set(cache.get_many([1, 2], include_stale=True)) == {1, 2}
+    cache.close()
+
+
+def test__DiskCache_base_url(tmp_path):
+    path = tmp_path / "bmo.sqlite"
+    staging = _DiskCache(path, ttl=10, base_url="https://staging.example/rest")
+    staging.set_many({1: {"id": 1, "nick": "jill"}})
+    production = _DiskCache(path, ttl=10, base_url="https://production.example/rest")
+    assert production.get_many([1]) == {}
+    assert staging.get_many([1]) == {1: {"id": 1, "nick": "jill"}}
+    staging.close()
+    production.close()
+
+
+@mock.patch("mots.bmo.requests.Session.get")
+def test_BMOClient_get_users_by_ids_base_url(get):
+    get.return_value = mock_response({"users": [{"id": 1, "nick": "jill"}]})
+    with BMOClient(token="test", base_url="https://staging.example/rest") as client:
+        client.get_users_by_ids([1])
+
+    # Neither the in-memory nor the on-disk cache is shared between instances.
+    get.return_value = mock_response({"users": [{"id": 1, "nick": "otis"}]})
+    with BMOClient(token="test", base_url="https://production.example/rest") as client:
+        assert client.get_users_by_ids([1]) == {1: {"id": 1, "nick": "otis"}}
+    assert get.call_count == 2
+
+
+@mock.patch("mots.bmo.requests.Session.get")
+def test_BMOClient_get_users_by_ids_disk_cache(get):
+    get.return_value = mock_response({"users": [{"id": 1, "nick": "jill"}]})
+    with BMOClient(token="test") as client:
+        client.get_users_by_ids([1])
+    assert get.call_count == 1
+
+    # Simulate a new process by clearing the in-memory cache.
+    BMOClient._cache.clear()
+    with BMOClient(token="test") as client:
+        assert client.get_users_by_ids([1]) == {1: {"id": 1, "nick": "jill"}}
+    assert get.call_count == 1
+
+    BMOClient._cache.clear()
+    with BMOClient(token="test", use_cache=False) as client:
+        client.get_users_by_ids([1])
+    assert get.call_count == 2
+
+
+@mock.patch("mots.bmo.requests.Session.get")
+def test_BMOClient_get_users_by_ids_refresh(get):
+    get.return_value = mock_response({"users": [{"id": 1, "nick": "jill"}]})
+    with BMOClient(token="test") as client:
+        client.get_users_by_ids([1])
+
+    # Refreshing ignores cached users, but still writes fetched users to the caches.
+    get.return_value = mock_response({"users": [{"id": 1, "nick": "otis"}]})
+    with BMOClient(token="test", refresh=True) as client:
+        assert client.get_users_by_ids([1]) == {1: {"id": 1, "nick": "otis"}}
+    assert get.call_count == 2
+
+    with BMOClient(token="test") as client:
+        assert client.get_users_by_ids([1]) == {1: {"id": 1, "nick": "otis"}}
+    BMOClient._cache.clear()
+    with BMOClient(token="test") as client:
+        assert client.get_users_by_ids([1]) == {1: {"id": 1, "nick": "otis"}}
+    assert get.call_count == 2
+
+
+@mock.patch("mots.bmo.requests.Session.get")
+def test_BMOClient_get_users_by_ids_stale_fallback(get, monkeypatch):
+    monkeypatch.setattr(settings, "BUGZILLA_CACHE_TTL", -1)
+    get.return_value = mock_response({"users": [{"id": 1, "nick": "jill"}]})
+    with BMOClient(token="test") as client:
+        client.get_users_by_ids([1])
+
+    BMOClient._cache.clear()
+    get.side_effect = requests.ConnectionError
+    with BMOClient(token="test") as client:
+        assert client.get_users_by_ids([1]) == {1: {"id": 1, "nick": "jill"}}
+        with pytest.raises(requests.ConnectionError):
+            client.get_users_by_ids([2])
+
+
+@mock.patch("mots.bmo.requests.Session.get")
+def test_BMOClient_get_users_by_ids_chunked(get, monkeypatch):
+    monkeypatch.setattr(BMOClient, "IDS_PER_REQUEST", 2)
+
+    def _get(url, params):
+        return mock_response({"users": [{"id": i} for i in params["ids"]]})
+
+    get.side_effect = _get
+    with BMOClient(token="test", use_cache=False) as client:
+        result = client.get_users_by_ids([1, 2, 3, 4, 5])
+    assert get.call_count == 3
+    assert sorted(result) == [1, 2, 3, 4, 5]
+
+
+@mock.patch("mots.bmo.BMOClient")
+def test_get_bmo_data_deduplicates_ids(client):
+    people = [{"bmo_id": 2}, {"bmo_id": 1}, {"bmo_id": "2"}]
+    get_bmo_data(people)
+    get_users_by_ids = client.return_value.__enter__.return_value.get_users_by_ids
+    get_users_by_ids.assert_called_once_with([1, 2])
+
+
+@mock.patch("mots.bmo.requests.Session.get")
+def test_BMOClient_error_response(get, caplog):
+    get.return_value = mock_response({}, status_code=429)
+    get.return_value.headers = {"Retry-After": "120"}
+    with BMOClient(token="test", use_cache=False) as client:
+        assert client.get_users_by_ids([1]) is None
+        assert client.get_matches("jill") is None
+    assert "Error searching [1]: 429" in caplog.text
+    assert "Retry after: 120" in caplog.text
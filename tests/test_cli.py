@@ -4,10 +4,134 @@
 
 """Test various CLI commands."""
 
-from mots.cli import version
+from unittest import mock
+import argparse
 import subprocess
 
+import pytest
+
+from mots.cli import (
+    _build_directory,
+    _load_config,
+    create_parser,
+    export_and_clean,
+    ls,
+    main,
+    query,
+    version,
+)
+from mots.settings import settings
+
 
 def test__cli__version():
     out = subprocess.check_output(["mots", "--version"])
     assert out.decode("utf-8").strip() == version()
+
+
+def test__cli__create_parser_selected_command():
+    parser = create_parser(argv=["query", "birds/parrot"])
+    args = parser.parse_args(["query", "birds/parrot"])
+    assert args.paths == ["birds/parrot"]
+    assert args.func == query
+
+    # Other commands are registered, but their arguments are not populated.
+    with pytest.raises(SystemExit):
+        parser.parse_args(["clean", "--refresh"])
+
+    # All commands are populated when no command is selected.
+    args = create_parser(argv=[]).parse_args(["clean", "--refresh"])
+    assert args.refresh
+
+
+@pytest.mark.parametrize("error", [None, ConnectionError])
+@mock.patch("mots.cli._check_for_updates")
+@mock.patch("mots.cli.update_check_due", return_value=True)
+def test__cli__main_update_check_stamp(
+    update_check_due, check_for_updates, tmp_path, monkeypatch, error
+):
+    stamp = tmp_path / ".last_update_check"
+    monkeypatch.setattr(settings, "RESOURCE_DIRECTORY", tmp_path)
+    monkeypatch.setattr(settings, "OVERRIDES_FILE", tmp_path / "overrides.yml")
+    monkeypatch.setattr(settings, "UPDATE_CHECK_STAMP_FILE", stamp)
+    monkeypatch.setattr(settings, "CHECK_FOR_UPDATES", True)
+    check_for_updates.side_effect = error
+    main(argparse.Namespace(func=mock.MagicMock()))
+
+    # Only successful checks are recorded, so that failed checks are retried.
+    check_for_updates.assert_called_once()
+    assert stamp.exists() is (error is None)
+
+
+def test__cli__load_config_cached(repo):
+    args = argparse.Namespace(path=repo / "mots.yml")
+    file_config = _load_config(args)
+    assert _load_config(args) is file_config
+
+    # Writing the file changes its modification time and size, invalidating the cache.
+    file_config.config["modules"].pop()
+    file_config.write()
+    assert _load_config(args) is not file_config
+
+
+@mock.patch("mots.cli._build_directory", wraps=_build_directory)
+def test__cli__query_cached(build_directory, repo, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(settings, "INDEX_CACHE_DIRECTORY", tmp_path / "cache")
+    monkeypatch.setattr("mots.directory.INDEX_TIME_MARGIN", 0)
+    monkeypatch.chdir(repo)
+    parser = create_parser()
+
+    args = parser.parse_args(["query", "canines/red_fox", "--path", "mots.yml"])
+    query(args)
+    assert build_directory.call_count == 1
+
+    # Querying an unowned path that did not change does not reload the directory.
+    query(args)
+    assert build_directory.call_count == 1
+    assert capsys.readouterr().out == "canines/red_fox:\n" * 2
+
+    # A path added since the index was cached reloads the directory.
+    monkeypatch.setattr("mots.directory.INDEX_TIME_MARGIN", 60)
+    (repo / "canines" / "wolf").touch()
+    query(parser.parse_args(["query", "canines/wolf", "--path", "mots.yml"]))
+    assert build_directory.call_count == 2
+    assert capsys.readouterr().out == "canines/wolf:pets\n"
+
+
+def test__cli__ls(repo, capsys):
+    ls(argparse.Namespace(path=repo / "mots.yml"))
+
+    # Modules are printed as they are ordered in the file, one per line.
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    assert lines[0].startswith("[{'machine_name': 'domesticated_animals', 'name':")
+
+
+@pytest.mark.parametrize("extra_args", [[], ["--format", "rst"]])
+@mock.patch("mots.config.get_bmo_data")
+def test__cli__export_and_clean(get_bmo_data, repo, monkeypatch, extra_args):
+    get_bmo_data.return_value = {}
+    monkeypatch.chdir(repo)
+    args = create_parser().parse_args(
+        ["export-and-clean", "--path", str(repo / "mots.yml"), *extra_args]
+    )
+    export_and_clean(args)
+
+    assert "Domesticated Animals" in (repo / "mots.rst").read_text()
+    assert _load_config(args).check_hashes() == []
+
+
+@pytest.mark.parametrize("extra_args", [[], ["--format", "rst"]])
+@mock.patch("mots.config.get_bmo_data")
+def test__cli__export_and_clean__working_directory(
+    get_bmo_data, repo, monkeypatch, extra_args
+):
+    get_bmo_data.return_value = {}
+    monkeypatch.chdir(repo.parent)
+    args = create_parser().parse_args(
+        ["export-and-clean", "--path", str(repo / "mots.yml"), *extra_args]
+    )
+    export_and_clean(args)
+
+    # The export path is relative to the working directory, regardless of format.
+    assert "Domesticated Animals" in (repo.parent / "mots.rst").read_text()
+    assert (repo / "mots.rst").read_text() == ""
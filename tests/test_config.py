@@ -5,17 +5,43 @@
 """Test config module."""
 
 from operator import itemgetter
+import hashlib
+import io
+import json
+from pathlib import Path
 from unittest import mock
 
 import pytest
 
 from mots.config import (
     FileConfig,
+    calculate_config_hash,
     calculate_hashes,
     clean,
     reference_anchor_for_module,
 )
 from mots.directory import Directory
+from mots.settings import settings
+
+# A configuration with scalars that YAML 1.1 does not load as strings.
+YAML_1_1_CONFIG = """\
+repo: test_repo
+people:
+  - &no
+    bmo_id: 1
+    name: jill
+    nick: no
+modules:
+  - machine_name: pets
+    name: Pets
+    description: On
+    includes:
+      - off
+    meta:
+      duration: 1:20
+    owners:
+      - *no
+"""
 
 
 @pytest.fixture
@@ -34,23 +60,85 @@ def test_calculate_hashes(config):
     hashes = calculate_hashes(config, export)[1]
 
     assert (
-        hashes["config"] == "b69f7e77313ac6b47e90d4f3298f32bbd668b3f5"
+        hashes["config"] == "4005be7124eb228654a1f4dcb2e4cf618ba60584"
     ), "Was `conftest.config` changed?"
     assert hashes["export"] == "da39a3ee5e6b4b0d3255bfef95601890afd80709"
 
 
+def test_calculate_hashes__which(config):
+    hashes = calculate_hashes(config, None, which=("config",))[1]
+    assert hashes == {"config": calculate_config_hash(config)}
+
+    hashes = calculate_hashes(config, b"", which=("export",))[1]
+    assert hashes == {"export": "da39a3ee5e6b4b0d3255bfef95601890afd80709"}
+
+
+def test_calculate_config_hash__canonical_json(config):
+    content = json.dumps(
+        {key: value for key, value in config.items() if key != "updated_at"},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    expected = hashlib.sha1(content.encode("utf-8")).hexdigest()
+    assert calculate_config_hash(config) == expected
+
+
+def test_calculate_config_hash__legacy(config):
+    assert (
+        calculate_config_hash(config, legacy=True)
+        == "b69f7e77313ac6b47e90d4f3298f32bbd668b3f5"
+    ), "Was `conftest.config` changed?"
+
+
+def test_calculate_config_hash__ignores_formatting(repo):
+    file_config = FileConfig(repo / "mots.yml")
+    file_config.load()
+    config_hash = calculate_config_hash(file_config.config)
+
+    # Comments and key order do not affect the hash, but values do.
+    file_config.config.yaml_set_start_comment("Some comment.")
+    file_config.config.move_to_end("repo")
+    assert calculate_config_hash(file_config.config) == config_hash
+    file_config.config["repo"] = "another-repo"
+    assert calculate_config_hash(file_config.config) != config_hash
+
+
+@pytest.mark.parametrize("file_digest", [True, False])
+def test_calculate_hashes__export_file(config, monkeypatch, file_digest):
+    if not file_digest:
+        monkeypatch.delattr(hashlib, "file_digest", raising=False)
+    export = b"some exported directory\n" * 100000
+    hashes = calculate_hashes(config, io.BytesIO(export))[1]
+    assert hashes == calculate_hashes(config, export)[1]
+
+
+def test_FileConfig__init(tmp_path, monkeypatch):
+    repo = tmp_path / "some-repo"
+    repo.mkdir()
+    monkeypatch.chdir(repo)
+    file_config = FileConfig(Path("mots.yml"))
+    file_config.init()
+    assert file_config.config["repo"] == "some-repo"
+    assert (repo / "mots.yml").is_file()
+
+
 def test_FileConfig__check_hashes(repo):
     file_config = FileConfig(repo / "mots.yml")
     file_config.load()
     errors = file_config.check_hashes()
     assert errors == []
 
+    # Both legacy and current config hashes are accepted.
+    file_config.config["hashes"]["config"] = calculate_config_hash(file_config.config)
+    assert file_config.check_hashes() == []
+
     file_config.config["hashes"]["config"] = "asdf"
     file_config.config["hashes"]["export"] = "ghjk"
     errors = file_config.check_hashes()
     assert errors == [
         "Mismatch in config hash detected.",
-        "b69f7e77313ac6b47e90d4f3298f32bbd668b3f5 does not match asdf",
+        "4005be7124eb228654a1f4dcb2e4cf618ba60584 does not match asdf",
         "config file is out of date.",
         "Mismatch in export hash detected.",
         "da39a3ee5e6b4b0d3255bfef95601890afd80709 does not match ghjk",
@@ -58,6 +146,111 @@ def test_FileConfig__check_hashes(repo):
     ]
 
 
+def test_FileConfig__check_hashes__missing(repo):
+    file_config = FileConfig(repo / "mots.yml")
+    file_config.load()
+    del file_config.config["hashes"]["export"]
+    assert file_config.check_hashes() == [
+        "Missing export hash.",
+        "export file is out of date.",
+    ]
+
+    del file_config.config["hashes"]
+    assert file_config.check_hashes() == [
+        "Missing config hash.",
+        "config file is out of date.",
+        "Missing export hash.",
+        "export file is out of date.",
+    ]
+
+    # The export hash is not expected when no export is configured.
+    del file_config.config["export"]
+    assert file_config.check_hashes() == [
+        "Missing config hash.",
+        "config file is out of date.",
+    ]
+
+
+def test_FileConfig__load__unchanged(repo):
+    file_config = FileConfig(repo / "mots.yml")
+    file_config.load()
+    config = file_config.config
+
+    # Loading an unchanged file keeps the loaded configuration.
+    file_config.load()
+    assert file_config.config is config
+
+    # The written file is not reloaded either.
+    file_config.write()
+    file_config.load()
+    assert file_config.config is config
+
+    # Changing the file on disk invalidates the loaded configuration.
+    path = repo / "mots.yml"
+    path.write_text(path.read_text() + "\n")
+    file_config.load()
+    assert file_config.config is not config
+    assert file_config.config == config
+
+
+def test_FileConfig__json_cache(repo, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_CACHE_DIRECTORY", tmp_path / "cache")
+    # The cache is also used in debug mode, so that it can be diagnosed.
+    monkeypatch.setattr(settings, "DEBUG", 1)
+    file_config = FileConfig(repo / "mots.yml", json_cache=True)
+    file_config.load()
+    assert file_config.json_cache_path.exists()
+
+    cached_config = FileConfig(repo / "mots.yml", json_cache=True)
+    cached_config.load()
+    assert type(cached_config.config) is dict
+    assert cached_config.config == file_config.config
+
+    # Changing the config file invalidates the cache.
+    file_config.config["modules"].pop()
+    file_config.write()
+    cached_config.load()
+    assert len(cached_config.config["modules"]) == 1
+
+
+def test_FileConfig__load_fast__yaml_1_2(tmp_path):
+    """Ensure the fast loader resolves scalars like the round-trip loader."""
+    path = tmp_path / "mots.yml"
+    path.write_text(YAML_1_1_CONFIG)
+
+    file_config = FileConfig(path)
+    file_config.load()
+    fast_config = FileConfig(path)
+    fast_config.load_fast()
+    assert fast_config.config == file_config.config
+
+    # Directories load unloaded configs with the fast loader.
+    directory = Directory(FileConfig(path))
+    assert directory.modules[0].description == "On"
+    assert directory.modules[0].includes == ["off"]
+
+
+def test_FileConfig__json_cache__yaml_1_2(tmp_path, monkeypatch):
+    """Ensure read-only loads resolve scalars like the round-trip loader."""
+    monkeypatch.setattr(settings, "INDEX_CACHE_DIRECTORY", tmp_path / "cache")
+    path = tmp_path / "mots.yml"
+    path.write_text(YAML_1_1_CONFIG)
+
+    file_config = FileConfig(path)
+    file_config.load()
+    for _ in range(2):
+        # Check both the parsed and the cached configuration.
+        cached_config = FileConfig(path, json_cache=True)
+        cached_config.load()
+        assert cached_config.config == file_config.config
+
+    module = cached_config.config["modules"][0]
+    assert module["description"] == "On"
+    assert module["includes"] == ["off"]
+    assert module["meta"]["duration"] == "1:20"
+    assert module["owners"][0]["nick"] == "no"
+
+
 def test_reference_anchor_for_module(repo):
     """Test that a reference to an existing person is correctly updated.
 
@@ -221,6 +414,32 @@ def test_clean_added_user_no_refresh(get_bmo_data, repo, config, test_bmo_user_d
     }, "New entry should have been updated after clean."
 
 
+@pytest.mark.parametrize("refresh", [False, True])
+@mock.patch("mots.config.get_bmo_data")
+def test_clean_added_user_in_module(
+    get_bmo_data, repo, config, test_bmo_user_data, refresh
+):
+    """Test that people only referenced in modules are synchronized with BMO."""
+    get_bmo_data.return_value = test_bmo_user_data
+
+    file_config = FileConfig(repo / "mots.yml")
+    file_config.load()
+    file_config.config["modules"][0]["peers"].append({"bmo_id": 3})
+    file_config.write()
+
+    clean(file_config, refresh=refresh)
+
+    # All people are requested from Bugzilla at once, bypassing caches if refreshing.
+    get_bmo_data.assert_called_once()
+    assert get_bmo_data.call_args[1]["refresh"] is refresh
+    requested = get_bmo_data.call_args[0][0]
+    assert sorted(person["bmo_id"] for person in requested) == [0, 1, 2, 3, 4]
+
+    cleaned = sorted(file_config.config["people"], key=itemgetter("bmo_id"))
+    assert len(cleaned) == 5
+    assert cleaned[3] == {"bmo_id": 3, "name": "seven", "nick": "nanotubes"}
+
+
 @mock.patch("mots.config.get_bmo_data")
 def test_clean_added_user_with_refresh(get_bmo_data, repo, config, test_bmo_user_data):
     """Test that updated BMO data is reflected when cleaning with a refresh."""
@@ -4,9 +4,40 @@
 
 """Tests for directory module."""
 
-from mots.directory import Directory, Person, QueryResult
+from dataclasses import asdict, fields
+import pickle
+import sys
+import time
+
+import pytest
+
+from mots.directory import (
+    Directory,
+    People,
+    Person,
+    QueryResult,
+    _existing_paths,
+    _walk,
+    _walk_parallel,
+    cache_directory,
+    load_cached_directory,
+)
 from mots.module import Module
 from mots.config import FileConfig
+from mots.settings import settings
+
+
+def test_directory__Directory__uses_loaded_config(repo):
+    """Ensure the directory only loads the config when it is not already loaded."""
+    file_config = FileConfig(repo / "mots.yml")
+    Directory(file_config)
+    # The configuration is not round-tripped when loaded by the directory.
+    assert type(file_config.config) is dict
+
+    file_config.load()
+    config = file_config.config
+    Directory(file_config)
+    assert file_config.config is config
 
 
 def test_directory__Directory(repo):
@@ -52,6 +83,47 @@ def test_directory__Directory(repo):
     ]
 
 
+def test_directory__Directory__skips_vcs_paths(repo):
+    (repo / ".git" / "objects").mkdir(parents=True)
+    (repo / ".git" / "objects" / "some-object").touch()
+    file_config = FileConfig(repo / "mots.yml")
+    directory = Directory(file_config)
+    directory.load(full_paths=True)
+
+    assert len(directory.index) == 24
+    assert not any(".git" in path.parts for path in directory.index)
+
+
+def test_directory__existing_paths(repo):
+    (repo / "birds" / "broken").symlink_to(repo / "birds" / "missing")
+    paths = [
+        repo / "birds" / "eagle",
+        repo / "birds" / "parrot",
+        repo / "birds" / "missing",
+        repo / "birds" / "broken",
+        repo / "bovines" / "cow",
+        repo / "missing" / "cow",
+        repo / "missing" / "sheep",
+    ]
+    assert _existing_paths(paths) == {path for path in paths if path.exists()}
+    assert _existing_paths(paths) == {
+        repo / "birds" / "eagle",
+        repo / "birds" / "parrot",
+        repo / "bovines" / "cow",
+    }
+
+
+def test_directory__walk_parallel(repo):
+    (repo / ".git").mkdir()
+    (repo / ".git" / "HEAD").touch()
+    paths = _walk_parallel(repo, exclude=(".git",))
+    assert len(paths) == len(set(paths))
+    assert set(paths) == set(_walk(repo, exclude=(".git",)))
+    assert set(paths) == {
+        path for path in repo.glob("**/*") if path.relative_to(repo).parts[0] != ".git"
+    }
+
+
 def test_directory__Directory_new_path(repo):
     file_config = FileConfig(repo / "mots.yml")
     directory = Directory(file_config)
@@ -186,7 +258,104 @@ def test_directory__QueryResult_empty_addition():
     assert not (empty_result + other_empty_result)
 
 
+def test_directory__QueryResult_order():
+    owner = {"bmo_id": 1, "name": "Jane", "nick": "jane"}
+    peer = {"bmo_id": 2, "name": "John", "nick": "john"}
+    first = Module(machine_name="first", repo_path="/repos/test", owners=[owner])
+    second = Module(
+        machine_name="second", repo_path="/repos/test", owners=[owner], peers=[peer]
+    )
+    result = QueryResult({"a": [second], "b": [first, second], "c": [first]})
+
+    # Results are deduplicated, in the order in which they were found.
+    assert result.paths == ["a", "b", "c"]
+    assert result.modules == [second, first]
+    assert result.owners == [Person(**owner)]
+    assert result.peers == [Person(**peer)]
+
+
 def test_directory__peers_and_owners(repo):
     file_config = FileConfig(repo / "mots.yml")
     directory = Directory(file_config)
     assert directory.peers_and_owners == [0, 1, 2]
+
+
+def test_directory__Directory__changed_since_index(repo):
+    directory = Directory(FileConfig(repo / "mots.yml"))
+    assert directory.changed_since_index("birds/parrot")
+
+    directory.load()
+    directory.indexed_at = time.time() + 60
+    assert not directory.changed_since_index("birds/parrot", "birds/missing")
+
+    directory.indexed_at = time.time() - 60
+    assert directory.changed_since_index("birds/parrot")
+    assert not directory.changed_since_index("birds/missing")
+
+
+def test_directory__cache_directory(repo, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_CACHE_DIRECTORY", tmp_path / "cache")
+    config_path = repo / "mots.yml"
+    assert load_cached_directory(config_path) is None
+
+    file_config = FileConfig(config_path)
+    directory = Directory(file_config)
+    directory.load()
+    cache_directory(directory, config_path)
+
+    cached = load_cached_directory(config_path)
+    assert cached.index.keys() == directory.index.keys()
+    assert cached.query("birds/parrot").path_map == {
+        "birds/parrot": [cached.modules_by_machine_name["pets"]]
+    }
+
+    # Changing the config file invalidates the cache.
+    file_config.config["modules"].pop()
+    file_config.write()
+    assert load_cached_directory(config_path) is None
+
+
+def test_directory__cache_directory_repo_head(repo, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_CACHE_DIRECTORY", tmp_path / "cache")
+    config_path = repo / "mots.yml"
+    (repo / ".git" / "refs" / "heads").mkdir(parents=True)
+    (repo / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    (repo / ".git" / "refs" / "heads" / "main").write_text("a" * 40)
+
+    directory = Directory(FileConfig(config_path))
+    directory.load()
+    cache_directory(directory, config_path)
+    assert load_cached_directory(config_path) is not None
+
+    # Checking out a different commit invalidates the cache.
+    (repo / ".git" / "refs" / "heads" / "main").write_text("b" * 40)
+    assert load_cached_directory(config_path) is None
+
+
+def test_people__add(config):
+    people = People(config["people"][:-1], {})
+    people.add(config["people"][-1])
+
+    expected = People(config["people"], {})
+    assert people.people == expected.people
+    assert people.by_bmo_id == expected.by_bmo_id
+    assert people.serialized == expected.serialized
+
+    # The serialized list is kept up to date when it was built before adding.
+    people = People(config["people"][:-1], {})
+    assert len(people.serialized) == len(config["people"]) - 1
+    people.add(config["people"][-1])
+    assert people.serialized == expected.serialized
+
+
+def test_person__serialize():
+    person = Person(bmo_id=1, name="Jane", nick="jane")
+    assert person.serialize() == asdict(person)
+    assert list(person.serialize()) == [field.name for field in fields(Person)]
+
+
+@pytest.mark.skipif(sys.version_info < (3, 10), reason="Requires Python 3.10+.")
+def test_person__slots():
+    person = Person(bmo_id=1, name="Jane", nick="jane")
+    assert not hasattr(person, "__dict__")
+    assert pickle.loads(pickle.dumps(person)) == person
@@ -4,12 +4,17 @@
 
 """Test export functionalities."""
 
+import io
 from unittest import mock
 
 import pytest
 
+from mots.config import FileConfig
+from mots.directory import Directory
 from mots.export import (
+    Exporter,
     export_to_format,
+    export_to_stream,
     escape_for_rst,
     escape_for_md,
     format_paths_for_rst,
@@ -35,6 +40,28 @@ def test_export_to_format(exporter):
         export_to_format(directory, frmt="unsupported-format")
 
 
+@pytest.mark.parametrize("frmt", ["rst", "md"])
+def test_export_to_stream(repo, frmt):
+    file_config = FileConfig(repo / "mots.yml")
+    file_config.load()
+    directory = Directory(file_config)
+    directory.load()
+
+    stream = io.StringIO()
+    export_to_stream(directory, stream, frmt=frmt)
+    assert stream.getvalue() == export_to_format(directory, frmt=frmt)
+
+    with pytest.raises(ValueError):
+        export_to_stream(directory, stream, frmt="unsupported-format")
+
+
+def test_exporter__shared_env():
+    first = Exporter(mock.MagicMock())
+    second = Exporter(mock.MagicMock())
+    assert first.env is second.env
+    assert first._get_template("rst") is second._get_template("rst")
+
+
 def test_escape_for_rst():
     test_string = (
         "A couple of backslashes \\ \\\n"
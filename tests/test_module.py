@@ -4,7 +4,11 @@
 
 """Integration tests for mots.module."""
 
+from pathlib import Path
+from unittest import mock
+
 from mots.config import FileConfig, add, validate
+from mots.directory import Person
 from mots.module import Module
 
 
@@ -29,6 +33,17 @@ def test_module__Module(repo):
     assert len(m.submodules[0].owners) == 1
 
 
+def test_module__Module__owner_and_peer_people(repo):
+    file_config = FileConfig(repo / "mots.yml")
+    file_config.load()
+    m = Module(repo_path=repo, **file_config.config["modules"][0])
+
+    assert m.owner_people == [Person(**owner) for owner in m.owners]
+    assert m.peer_people == [Person(**peer) for peer in m.peers]
+    # The lists are only built once.
+    assert m.owner_people is m.owner_people
+
+
 def test_module__Module__calculate_paths(repo):
     file_config = FileConfig(repo / "mots.yml")
     file_config.load()
@@ -38,6 +53,60 @@ def test_module__Module__calculate_paths(repo):
     assert len(m.submodules[0].calculate_paths()) == 3
 
 
+def test_module__Module__calculate_paths__glob_cache(repo):
+    file_config = FileConfig(repo / "mots.yml")
+    file_config.load()
+    modules = file_config.config["modules"]
+    m = Module(repo_path=repo, **modules[0])
+    glob_cache = {}
+    paths = m.calculate_paths(glob_cache)
+    assert paths == m.calculate_paths()
+    assert set(m.includes + m.excludes) <= set(glob_cache)
+
+    # Cached expansions are used instead of globbing the repo again.
+    with mock.patch("mots.module.Path.glob") as glob:
+        assert m.calculate_paths(glob_cache) == paths
+    glob.assert_not_called()
+
+
+def test_module__Module__calculate_paths__paths_cache(repo):
+    file_config = FileConfig(repo / "mots.yml")
+    file_config.load()
+    m = Module(repo_path=repo, **file_config.config["modules"][0])
+    paths_cache = {}
+    paths = m.calculate_paths({}, paths_cache)
+    assert paths == m.calculate_paths()
+    assert paths_cache == {
+        m: paths,
+        m.submodules[0]: m.submodules[0].calculate_paths(),
+    }
+
+    # Cached paths are returned as is, without expanding any pattern.
+    with mock.patch.object(Module, "_expand_pattern") as expand_pattern:
+        assert m.calculate_paths({}, paths_cache) is paths
+    expand_pattern.assert_not_called()
+
+
+def test_module__Module__calculate_paths__ancestor_pattern(repo):
+    m = Module(
+        machine_name="animals",
+        repo_path=repo,
+        includes=["**/*", "canines/**/*", "birds/**/*"],
+    )
+    expected = {
+        pattern: set(repo.glob(pattern)) for pattern in ("canines/**/*", "birds/**/*")
+    }
+    glob_cache = {}
+    with mock.patch.object(Path, "glob", autospec=True, side_effect=Path.glob) as glob:
+        m.calculate_paths(glob_cache)
+
+    # Only the broadest pattern is globbed, the others are filtered from its paths.
+    assert [call.args[1] for call in glob.call_args_list] == ["**/*"]
+    for pattern, paths in expected.items():
+        assert paths
+        assert set(glob_cache[pattern]) == paths
+
+
 def test_module__Module__validate(repo):
     m = Module(
         name="Some Module",
@@ -190,8 +259,11 @@ def test_module__validate__error_duplicate_machine_names(repo):
         ],
     }
 
-    messages = validate(config, repo)
+    with mock.patch("mots.config.Module") as module:
+        messages = validate(config, repo)
     assert messages == ["Duplicate machine name(s) found: m1, m3"]
+    # Modules are not validated when there are duplicate machine names.
+    module.assert_not_called()
 
 
 def test_module__validate__error_no_paths(repo):
@@ -238,3 +310,15 @@ def test_module__add(repo):
     ]
 
     # TODO: validate that includes, excludes, and owners are lists...
+
+
+def test_module__add__without_reload(repo):
+    file_config = FileConfig(repo / "mots.yml")
+    file_config.load()
+
+    add({"machine_name": "reptiles"}, file_config, write=False, reload=False)
+    add({"machine_name": "lizards"}, file_config, parent="reptiles", reload=False)
+    file_config.load()
+
+    module = file_config.modules_by_machine_name["reptiles"]
+    assert [m["machine_name"] for m in module["submodules"]] == ["lizards"]
@@ -4,15 +4,18 @@
 
 """Tests for utils module."""
 
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
+import os
 
 import pytest
 
 from mots.utils import (
+    chunk_list,
     generate_machine_readable_name,
     mkdir_if_not_exists,
     parse_real_name,
     touch_if_not_exists,
+    update_check_due,
 )
 
 
@@ -46,6 +49,12 @@ def test_generate_machine_readable_name():
     assert generate_machine_readable_name("test: testing") == "test_testing"
 
 
+def test_chunk_list():
+    assert chunk_list([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert chunk_list([1, 2], 5) == [[1, 2]]
+    assert chunk_list([], 5) == []
+
+
 def test_parse_real_name():
     assert parse_real_name("tëstér testerson (:test) [te/st]") == {
         "name": "tëstér testerson",
@@ -159,3 +168,24 @@ def test_touch_if_not_exists__exists(mock_path):
     touch_if_not_exists(path)
     assert path.exists.call_count == 2
     assert path.touch.call_count == 0
+
+
+@patch("mots.utils.sys.stdout")
+def test_update_check_due(stdout, tmp_path):
+    stamp = tmp_path / ".last_update_check"
+
+    stdout.isatty.return_value = False
+    assert not update_check_due(stamp, 100)
+    assert not stamp.exists()
+
+    stdout.isatty.return_value = True
+    assert update_check_due(stamp, 100)
+    # The stamp is only touched once a check succeeds.
+    assert not stamp.exists()
+    assert update_check_due(stamp, 100)
+    stamp.touch()
+    assert not update_check_due(stamp, 100)
+
+    # Pretend the last check happened a long time ago.
+    os.utime(stamp, (0, 0))
+    assert update_check_due(stamp, 100)